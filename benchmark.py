@@ -0,0 +1,497 @@
+import os
+import sys
+import builtins
+import time
+import shutil
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from PyQt5.QtCore import Qt
+
+from extractor import (DirectoryScanner, ScanChunk, FileIndex, PathFinderIndex, MergePlan, FileProcessor,
+                       HAS_CHARDET)
+
+if HAS_CHARDET:
+    import chardet
+
+
+def create_sample_tree(target_folder, dirs=200, files_per_dir=50, lines=20):
+    """Create a synthetic project tree for benchmarking"""
+    for d in range(dirs):
+        folder = os.path.join(target_folder, f"pkg_{d // 20}", f"module_{d}")
+        os.makedirs(folder, exist_ok=True)
+        for f in range(files_per_dir):
+            with open(os.path.join(folder, f"file_{f}.py"), 'w', encoding='utf-8') as fh:
+                fh.write(f"# module {d} file {f}\n" * lines)
+
+
+class SyscallCounter:
+    """Counts calls to os.stat and os.scandir while active"""
+
+    def __init__(self):
+        self.stat_calls = 0
+        self.scandir_calls = 0
+
+    def __enter__(self):
+        self._stat = os.stat
+        self._scandir = os.scandir
+
+        def counting_stat(*args, **kwargs):
+            self.stat_calls += 1
+            return self._stat(*args, **kwargs)
+
+        def counting_scandir(*args, **kwargs):
+            self.scandir_calls += 1
+            return self._scandir(*args, **kwargs)
+
+        os.stat = counting_stat
+        os.scandir = counting_scandir
+        return self
+
+    def __exit__(self, *exc):
+        os.stat = self._stat
+        os.scandir = self._scandir
+
+
+class SlowOpen:
+    """Adds a fixed delay to every open() below a directory, like a network drive would"""
+
+    def __init__(self, directory, latency):
+        self.directory = directory
+        self.latency = latency
+
+    def __enter__(self):
+        self._open = builtins.open
+
+        def slow_open(file, *args, **kwargs):
+            if isinstance(file, str) and file.startswith(self.directory):
+                time.sleep(self.latency)
+            return self._open(file, *args, **kwargs)
+
+        builtins.open = slow_open
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self._open
+
+
+class CountingFile:
+    """File wrapper that reports the bytes fetched from disk when it is closed"""
+
+    def __init__(self, handle, counter):
+        self.handle = handle
+        self.counter = counter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        raw = getattr(self.handle, 'buffer', self.handle).raw
+        self.counter.bytes_read += raw.tell()
+        self.handle.close()
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+
+class ReadCounter:
+    """Counts open() calls and bytes read below a directory while active"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.opens = 0
+        self.bytes_read = 0
+
+    def __enter__(self):
+        self._open = builtins.open
+
+        def counting_open(file, *args, **kwargs):
+            handle = self._open(file, *args, **kwargs)
+            if isinstance(file, str) and file.startswith(self.directory):
+                self.opens += 1
+                return CountingFile(handle, self)
+            return handle
+
+        builtins.open = counting_open
+        return self
+
+    def __exit__(self, *exc):
+        builtins.open = self._open
+
+
+def legacy_walk(root_directory, scanner):
+    """The previous os.walk + os.stat per entry scan"""
+    entries = 0
+    for root, dirs, files in os.walk(root_directory, topdown=True):
+        dirs[:] = [d for d in dirs if not scanner.should_ignore_path(os.path.join(root, d))]
+        for name in sorted(dirs, key=str.lower):
+            os.stat(os.path.join(root, name))
+            entries += 1
+        for name in sorted(files, key=str.lower):
+            full_path = os.path.join(root, name)
+            if scanner.should_ignore_path(full_path):
+                continue
+            os.stat(full_path)
+            entries += 1
+    return entries, 0
+
+
+def scandir_walk(root_directory, scanner):
+    """The DirEntry based scan used by TreeLoaderThread"""
+    entries = 0
+    entry_stats = 0
+    for root, dirs, files in scanner.walk(root_directory):
+        for entry in dirs + files:
+            entry.is_dir()
+            entry.stat()
+            entry_stats += 1
+            entries += 1
+    return entries, entry_stats
+
+
+def bench_scan(directory):
+    """Compare syscalls and wall time of the legacy walk and the scandir walker"""
+    print(f"\nDirectory scan: {directory}")
+    ignore_list = ['__pycache__', '*.pyc', '.git', 'node_modules']
+    runs = [
+        ("os.walk + os.stat", legacy_walk, DirectoryScanner(ignore_list, False)),
+        ("scandir walker", scandir_walk, DirectoryScanner(ignore_list, False)),
+        ("scandir, 8 threads", scandir_walk, DirectoryScanner(ignore_list, False, workers=8)),
+    ]
+
+    for label, walker, scanner in runs:
+        with SyscallCounter() as counter:
+            start = time.perf_counter()
+            entries, entry_stats = walker(directory, scanner)
+            elapsed = time.perf_counter() - start
+
+        print(f"  {label:<20} {entries:>8} entries  {elapsed * 1000:8.1f} ms  "
+              f"os.stat: {counter.stat_calls:>8}  listings: {counter.scandir_calls:>6}  "
+              f"DirEntry.stat: {entry_stats:>8}")
+
+    print("  DirEntry.stat() is served from the directory listing on Windows (no syscall) and cached per")
+    print("  entry elsewhere; entry types come from the listing, so no separate isdir/stat round trip is needed.")
+
+
+def synthetic_listings(entries, files_per_dir=100):
+    """Yield (root, dir names, file names) for a synthetic tree with the given number of entries"""
+    root_directory = os.path.join(os.sep, "projects", "large_repository")
+    dir_count = entries // (files_per_dir + 1)
+    yield root_directory, [f"module_{d}" for d in range(dir_count)], []
+    for d in range(dir_count):
+        yield os.path.join(root_directory, f"module_{d}"), [], [f"file_{f}.py" for f in range(files_per_dir)]
+
+
+def dict_records(entries):
+    """The previous per-entry dictionaries with a datetime and the parent path"""
+    records = []
+    mtime = time.time()
+    for root, dirs, files in synthetic_listings(entries):
+        for is_dir, names in ((True, dirs), (False, files)):
+            for name in names:
+                records.append({
+                    'name': name,
+                    'full_path': os.path.join(root, name),
+                    'is_dir': is_dir,
+                    'size': 0 if is_dir else 4096,
+                    'modified': datetime.fromtimestamp(mtime),
+                    'parent_path': root
+                })
+    return records
+
+
+def compact_records(entries):
+    """ScanChunk batches collected into a FileIndex, as the tree loader and GUI do"""
+    mtime_ns = time.time_ns()
+    file_index = None
+    chunk = None
+    dir_indices = {}
+    for root, dirs, files in synthetic_listings(entries):
+        if file_index is None:
+            file_index = FileIndex(root)
+            dir_indices[root] = -1
+            chunk = ScanChunk(0)
+        parent = dir_indices.pop(root)
+        for name in dirs:
+            dir_indices[os.path.join(root, name)] = chunk.start + len(chunk)
+            chunk.append(name, parent, True, 0, mtime_ns)
+        for name in files:
+            chunk.append(name, parent, False, 4096, mtime_ns)
+        if len(chunk) >= 100:
+            file_index.extend(chunk)
+            chunk = ScanChunk(chunk.start + len(chunk))
+    file_index.extend(chunk)
+    return file_index
+
+
+def bench_records(entries=500_000):
+    """Memory held by the scan results of a large tree in both record formats"""
+    print(f"\nScan records: {entries} entries")
+    for label, build in (("dict per entry", dict_records), ("parallel arrays", compact_records)):
+        tracemalloc.start()
+        start = time.perf_counter()
+        records = build(entries)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {label:<20} {len(records):>8} records  {current / 2**20:8.1f} MB held  "
+              f"{peak / 2**20:8.1f} MB peak  {elapsed * 1000:8.1f} ms")
+        del records
+
+
+def bench_path_finder(entries=500_000, queries=("m12f3", "file_42.py", "module_1234/", "xyz")):
+    """Time fuzzy path finder queries over a large synthetic tree"""
+    print(f"\nPath finder: {entries} paths")
+    root_directory = None
+    paths = []
+    for root, dirs, files in synthetic_listings(entries):
+        root_directory = root_directory or root
+        paths.extend(os.path.join(root, name) for name in files)
+    mtimes = [time.time_ns()] * len(paths)
+    
+    start = time.perf_counter()
+    index = PathFinderIndex(root_directory, paths, mtimes)
+    print(f"  {'index build':<20} {(time.perf_counter() - start) * 1000:8.1f} ms")
+    for query in queries:
+        start = time.perf_counter()
+        results = index.search(query)
+        elapsed = time.perf_counter() - start
+        best = index.rel_paths[results[0]] if results else "-"
+        print(f"  {query!r:<20} {elapsed * 1000:8.1f} ms  {len(results):>3} results  best: {best}")
+
+
+def create_mixed_files(target_folder, count=500):
+    """Add non UTF-8, CRLF, UTF-16 and binary files to a sample tree"""
+    folder = os.path.join(target_folder, "mixed")
+    os.makedirs(folder, exist_ok=True)
+    for i in range(count):
+        kind = i % 4
+        with open(os.path.join(folder, f"mixed_{i}.txt"), 'wb') as fh:
+            if kind == 0:
+                fh.write("Gr\u00fc\u00dfe aus K\u00f6ln\r\n".encode('latin-1') * 40)
+            elif kind == 1:
+                fh.write("windows line endings\r\n".encode('utf-8') * 40)
+            elif kind == 2:
+                fh.write("wide text \u00e9\n".encode('utf-16') * 40)
+            else:
+                fh.write(bytes(range(256)) * 4)
+
+
+def legacy_render(processor, full_path, file_size):
+    """The previous per-file path: a full UTF-8 validation read, chardet, then a text mode read"""
+    encoding = 'utf-8'
+    try:
+        with open(full_path, 'r', encoding='utf-8') as f:
+            f.read()
+    except UnicodeDecodeError:
+        if HAS_CHARDET:
+            with open(full_path, 'rb') as f:
+                result = chardet.detect(f.read(10000))
+                if result['confidence'] > 0.7:
+                    encoding = result['encoding']
+    with open(full_path, 'r', encoding=encoding, errors='replace') as f:
+        content = f.read()
+    if processor._is_binary_content(content):
+        return processor._file_header(full_path, f"📎 Binary file ({processor._format_file_size(file_size)})")
+    return processor._file_header(full_path) + processor._file_content(full_path, content)
+
+
+def bench_decode(directory):
+    """Opens and bytes read per merged file with the previous double read and the single read"""
+    print(f"\nFile decoding: {directory}")
+    plan = merge_plan(directory)
+    files = list(plan.selected_files())
+    processor = FileProcessor(plan, {'format': 'txt'})
+    runs = (("open per check + read", lambda path, size: legacy_render(processor, path, size)),
+            ("single bytes read", processor._render_file))
+
+    outputs = []
+    for label, render in runs:
+        with ReadCounter(directory) as counter:
+            start = time.perf_counter()
+            outputs.append([render(path, size) for path, size in files])
+            elapsed = time.perf_counter() - start
+        print(f"  {label:<24} {len(files):>6} files  {elapsed * 1000:8.1f} ms  opens: {counter.opens:>6}  "
+              f"read: {counter.bytes_read / 2**20:7.1f} MB of {plan.selected_bytes / 2**20:.1f} MB")
+    # Blocks only differ where a byte order mark decides the encoding (UTF-8 marks are no longer copied,
+    # UTF-16 is recognised without chardet)
+    changed = sum(old != new for old, new in zip(*outputs))
+    print(f"  {changed} of {len(files)} file blocks differ")
+
+
+def merge_plan(directory):
+    """A MergePlan selecting every file below a directory, in tree order"""
+    scanner = DirectoryScanner(['__pycache__', '.git'], False, root_directory=directory)
+    entries = []
+
+    def add_folder(path, depth):
+        dirs, files = scanner.list_directory(path)
+        children = dirs + files
+        for position, entry in enumerate(children):
+            is_dir = entry.is_dir()
+            entries.append((entry.path, depth, position == len(children) - 1, is_dir,
+                            0 if is_dir else entry.stat().st_size, Qt.Checked))
+            if is_dir:
+                add_folder(entry.path, depth + 1)
+
+    add_folder(directory, 0)
+    return MergePlan(directory, entries)
+
+
+def bench_merge(directory, runs=((1, 1), (4, 32), (8, 64), (16, 128)), latency=0.0):
+    """Merge a directory with sequential reads and with the reader pool; the outputs must match"""
+    print(f"\nMerge: {directory}" + (f" ({latency * 1000:.0f} ms simulated latency per open)" if latency else ""))
+    plan = merge_plan(directory)
+    output_folder = tempfile.mkdtemp(prefix="file_merger_out_")
+    try:
+        reference = None
+        # The first run only warms the page cache
+        for workers, readahead in ((1, 1),) + tuple(runs):
+            settings = {'output_folder': output_folder, 'format': 'txt', 'max_file_size': 10 * 2**20,
+                        'read_workers': workers, 'readahead': readahead}
+            processor = FileProcessor(plan, settings)
+            results = []
+            processor.finished_processing.connect(lambda path, ok: results.append(path))
+            with SlowOpen(directory, latency):
+                start = time.perf_counter()
+                processor.process_files()
+                elapsed = time.perf_counter() - start
+            with open(results[0], encoding='utf-8-sig') as f:
+                content = f.read()
+            os.remove(results[0])
+            
+            # The report header holds the time and settings
+            body = content[content.index("File Structure"):]
+            if reference is None:
+                reference = body
+                continue
+            label = "sequential" if workers == 1 else f"{workers} readers, {readahead} ahead"
+            print(f"  {label:<24} {plan.selected_count:>6} files  {elapsed * 1000:8.1f} ms  "
+                  f"{plan.selected_bytes / 2**20 / elapsed:7.1f} MB/s  "
+                  f"{'same output' if body == reference else 'OUTPUT DIFFERS'}")
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+class DecodingProcessor(FileProcessor):
+    """FileProcessor without the passthrough: every file is decoded and encoded again"""
+
+    def _is_passthrough(self, raw):
+        return False
+
+
+def bench_passthrough(directory, workers=1):
+    """Merge throughput with decode + encode of every file and with clean UTF-8 written as bytes"""
+    print(f"\nPassthrough: {directory}")
+    plan = merge_plan(directory)
+    output_folder = tempfile.mkdtemp(prefix="file_merger_out_")
+    try:
+        bodies = []
+        # The first run only warms the page cache
+        runs = (("warm-up", DecodingProcessor), ("decode + encode", DecodingProcessor), ("passthrough", FileProcessor))
+        for label, processor_class in runs:
+            settings = {'output_folder': output_folder, 'format': 'txt', 'max_file_size': 10 * 2**20,
+                        'read_workers': workers}
+            processor = processor_class(plan, settings)
+            results = []
+            processor.finished_processing.connect(lambda path, ok: results.append(path))
+            start = time.perf_counter()
+            processor.process_files()
+            elapsed = time.perf_counter() - start
+            with open(results[0], 'rb') as f:
+                content = f.read()
+            os.remove(results[0])
+            if label == "warm-up":
+                continue
+            
+            bodies.append(content[content.index("File Structure".encode()):])
+            print(f"  {label:<24} {plan.selected_count:>6} files  {elapsed * 1000:8.1f} ms  "
+                  f"{plan.selected_bytes / 2**20 / elapsed:7.1f} MB/s")
+        print(f"  {'same output' if bodies[0] == bodies[1] else 'OUTPUT DIFFERS'}")
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+def bench_remerge(directory, workers=4, edited=0.01):
+    """Merges without the block cache, filling it, unchanged and after editing some files
+
+    Appends a line to every hundredth file, so only run it on a generated tree.
+    """
+    print(f"\nRe-merge with block cache: {directory}")
+    plan = merge_plan(directory)
+    output_folder = tempfile.mkdtemp(prefix="file_merger_out_")
+    cache_path = os.path.join(output_folder, "block_cache.db")
+    try:
+        runs = (("warm-up", None, False), ("no cache", None, False), ("first merge", cache_path, False),
+                ("unchanged", cache_path, False), (f"{edited:.0%} edited", cache_path, True))
+        for label, block_cache, edit in runs:
+            if edit:
+                files = [path for path, size in plan.selected_files()]
+                for path in files[::int(1 / edited)]:
+                    with open(path, 'a', encoding='utf-8') as f:
+                        f.write("# edited\n")
+                plan = merge_plan(directory)
+            
+            settings = {'output_folder': output_folder, 'format': 'txt', 'read_workers': workers,
+                        'block_cache': block_cache, 'block_cache_size': 256 * 2**20}
+            processor = FileProcessor(plan, settings)
+            results = []
+            processor.finished_processing.connect(lambda path, ok: results.append(path))
+            with ReadCounter(directory) as counter:
+                start = time.perf_counter()
+                processor.process_files()
+                elapsed = time.perf_counter() - start
+            os.remove(results[0])
+            if label == "warm-up":
+                continue
+            
+            hits = processor.block_cache.hits if processor.block_cache else 0
+            print(f"  {label:<24} {plan.selected_count:>6} files  {elapsed * 1000:8.1f} ms  "
+                  f"files read: {counter.opens:>6}  cache hits: {hits:>6}")
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) > 1:
+        bench_scan(sys.argv[1])
+        bench_decode(sys.argv[1])
+        bench_passthrough(sys.argv[1])
+        bench_merge(sys.argv[1])
+        return
+    
+    bench_records()
+    bench_path_finder()
+
+    target_folder = tempfile.mkdtemp(prefix="file_merger_bench_")
+    try:
+        print("Creating sample tree...")
+        create_sample_tree(target_folder)
+        bench_scan(target_folder)
+        bench_passthrough(target_folder)
+        bench_remerge(target_folder)
+        create_mixed_files(target_folder)
+        bench_decode(target_folder)
+        bench_merge(target_folder)
+    finally:
+        shutil.rmtree(target_folder, ignore_errors=True)
+
+    target_folder = tempfile.mkdtemp(prefix="file_merger_bench_")
+    try:
+        create_sample_tree(target_folder, dirs=20)
+        bench_merge(target_folder, latency=0.001)
+    finally:
+        shutil.rmtree(target_folder, ignore_errors=True)
+
+    # Fewer, larger files, where the time goes into the contents rather than the per-file overhead
+    target_folder = tempfile.mkdtemp(prefix="file_merger_bench_")
+    try:
+        create_sample_tree(target_folder, dirs=20, lines=4000)
+        bench_passthrough(target_folder)
+    finally:
+        shutil.rmtree(target_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
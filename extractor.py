@@ -4,11 +4,24 @@ import json
 import logging
 import subprocess
 import threading
+import queue
+import struct
 import re
+import time
+import sqlite3
+import stat
+import heapq
+import mmap
+import codecs
+import hashlib
+from array import array
+from bisect import bisect_right
+from collections import deque, Counter
+from itertools import accumulate
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-import fnmatch
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QTreeWidget, QTreeWidgetItem, 
@@ -16,9 +29,12 @@ from PyQt5.QtWidgets import (
     QSplitter, QStatusBar, QToolBar, QAction, QFrame, QSizePolicy, QTextEdit,
     QTabWidget, QProgressBar, QSpinBox, QCheckBox, QComboBox, QGroupBox,
     QGridLayout, QLineEdit, QSlider, QMenuBar, QMenu, QShortcut, QDialog,
-    QListWidget, QListWidgetItem, QDialogButtonBox
+    QListWidget, QListWidgetItem, QDialogButtonBox, QTreeView
+)
+from PyQt5.QtCore import (
+    Qt, QSize, QThread, QObject, pyqtSignal, QTimer, QSettings, QFileSystemWatcher, QSocketNotifier,
+    QAbstractItemModel, QModelIndex, QSortFilterProxyModel, QStandardPaths
 )
-from PyQt5.QtCore import Qt, QSize, QThread, pyqtSignal, QTimer, QSettings
 from PyQt5.QtGui import QIcon, QFont, QPixmap, QKeySequence
 
 # Try to import optional dependencies
@@ -28,132 +44,2278 @@ try:
 except ImportError:
     HAS_CHARDET = False
 
+# Item data role marking directories whose contents have not been listed yet (lazy loading)
+LAZY_ROLE = Qt.UserRole + 1
+# Item data role marking directory items
+IS_DIR_ROLE = Qt.UserRole + 2
+
+
+class IgnoreRules:
+    """Compiled gitignore-style patterns from one source (ignore.txt or one .gitignore)
+    
+    Plain names and "*.ext" / "prefix*" patterns are answered with set and
+    suffix/prefix lookups. Everything else is combined into a single regex per
+    level, ordered so the last matching pattern wins, as in git.
+    """
+    GLOB_CHARS = set('*?[\\')
+    
+    def __init__(self, patterns: List[str], base: str = ''):
+        self.base = base
+        self.names = set()
+        self.dir_names = set()
+        self.suffixes = ()
+        self.prefixes = ()
+        self.negations = []
+        
+        rules = [rule for rule in (self._parse(line) for line in patterns) if rule]
+        has_negation = any(negated for negated, _, _, _ in rules)
+        suffixes, prefixes = [], []
+        file_parts, dir_parts = [], []
+        for negated, anchored, dir_only, body in rules:
+            if not has_negation and not anchored:
+                if not self.GLOB_CHARS & set(body):
+                    (self.dir_names if dir_only else self.names).add(body)
+                    continue
+                if not dir_only and body.startswith('*') and not self.GLOB_CHARS & set(body[1:]):
+                    suffixes.append(body[1:])
+                    continue
+                if not dir_only and body.endswith('*') and not self.GLOB_CHARS & set(body[:-1]):
+                    prefixes.append(body[:-1])
+                    continue
+            
+            regex = self._glob_to_regex(body)
+            if not anchored:
+                regex = '(?:.*/)?' + regex
+            self.negations.append(negated)
+            dir_parts.append(regex)
+            # Directory-only patterns never match files; keep the group numbering aligned
+            file_parts.append(regex if not dir_only else '(?!)')
+        
+        self.suffixes = tuple(suffixes)
+        self.prefixes = tuple(prefixes)
+        # Reversed so the first alternative that matches is the last pattern in the file
+        self.negations.reverse()
+        self.file_regex = self._combine(reversed(file_parts))
+        self.dir_regex = self._combine(reversed(dir_parts))
+    
+    @staticmethod
+    def _combine(parts) -> Optional['re.Pattern']:
+        parts = list(parts)
+        if not parts:
+            return None
+        return re.compile('|'.join(f'({part})' for part in parts), re.DOTALL)
+    
+    @staticmethod
+    def _parse(line: str) -> Optional[Tuple[bool, bool, bool, str]]:
+        """Parse one pattern line into (negated, anchored, dir_only, body)"""
+        line = line.rstrip('\n\r')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            return None
+        
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+        
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+        
+        # A slash anywhere but the end anchors the pattern to its directory
+        anchored = '/' in line
+        line = line.lstrip('/')
+        return negated, anchored, dir_only, line
+    
+    @staticmethod
+    def _glob_to_regex(pattern: str) -> str:
+        """Translate a gitignore glob into a regex; '*' and '?' never cross '/'"""
+        result = []
+        i, n = 0, len(pattern)
+        while i < n:
+            c = pattern[i]
+            if c == '*':
+                if pattern.startswith('**', i):
+                    at_start = i == 0 or pattern[i - 1] == '/'
+                    followed = pattern[i + 2:i + 3]
+                    if at_start and followed == '/':
+                        # "**/" - zero or more leading directories
+                        result.append('(?:.*/)?')
+                        i += 3
+                        continue
+                    if at_start and i + 2 == n:
+                        # trailing "/**" - everything inside
+                        result.append('.*')
+                        i += 2
+                        continue
+                    result.append('[^/]*')
+                    i += 2
+                    continue
+                result.append('[^/]*')
+            elif c == '?':
+                result.append('[^/]')
+            elif c == '[':
+                end = pattern.find(']', i + 2 if pattern[i + 1:i + 2] in ('!', '^') else i + 1)
+                if end == -1:
+                    result.append('\\[')
+                else:
+                    body = pattern[i + 1:end]
+                    if body[:1] in ('!', '^'):
+                        body = '^' + body[1:]
+                    result.append('[' + body.replace('\\', '\\\\') + ']')
+                    i = end
+            elif c == '\\' and i + 1 < n:
+                i += 1
+                result.append(re.escape(pattern[i]))
+            else:
+                result.append(re.escape(c))
+            i += 1
+        return ''.join(result)
+    
+    def match(self, rel_path: str, name: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included by a negation, None if no pattern matched"""
+        if name in self.names or (is_dir and name in self.dir_names):
+            return True
+        if self.suffixes and name.endswith(self.suffixes):
+            return True
+        if self.prefixes and name.startswith(self.prefixes):
+            return True
+        
+        regex = self.dir_regex if is_dir else self.file_regex
+        if regex is not None:
+            if self.base:
+                rel_path = rel_path[len(self.base) + 1:]
+            match = regex.fullmatch(rel_path)
+            if match:
+                return not self.negations[match.lastindex - 1]
+        return None
+
+
+class IgnoreMatcher:
+    """Stack of IgnoreRules from the root down to one directory; deeper levels take precedence"""
+    
+    def __init__(self, levels: Tuple[IgnoreRules, ...] = ()):
+        self.levels = levels
+    
+    def child(self, rules: IgnoreRules) -> 'IgnoreMatcher':
+        return IgnoreMatcher(self.levels + (rules,))
+    
+    def is_ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        """Check a path relative to the scan root ('/' separated)"""
+        for rules in reversed(self.levels):
+            result = rules.match(rel_path, name, is_dir)
+            if result is not None:
+                return result
+        return False
+
+
+class StatCache:
+    """Session-wide file metadata (is_dir, size, mtime_ns) shared by scanning, merging, previews and projects
+    
+    Scanners fill it one folder at a time from the stat info their listings already
+    carry, together with the folder's mtime. A folder listed again with another mtime
+    replaces all of its entries, and the watcher drops the entries of changed folders
+    and modified files, so a lookup needs no syscall until the disk changes. `hits` is
+    the number of stat calls saved, `misses` the number actually made.
+    """
+    
+    def __init__(self):
+        self._entries = {}
+        # Folder path -> (mtime_ns, paths of its entries) as last listed
+        self._listings = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def put_listing(self, dir_path: str, mtime_ns: Optional[int], entries: List[Tuple[str, bool, int, int]]):
+        """Store the (path, is_dir, size, mtime_ns) entries of a folder listed at mtime_ns (None if unknown)"""
+        with self._lock:
+            previous = self._listings.get(dir_path)
+            if previous is not None and (mtime_ns is None or previous[0] != mtime_ns):
+                # Entries may have been deleted or renamed since
+                self._drop_listing(dir_path)
+            self._listings[dir_path] = (mtime_ns, [entry[0] for entry in entries])
+            for path, is_dir, size, entry_mtime_ns in entries:
+                self._entries[path] = (is_dir, size, entry_mtime_ns)
+    
+    def lookup(self, path: str) -> Optional[Tuple[bool, int, int]]:
+        """Cached metadata of a path, stat'ed on a miss; None if it does not exist"""
+        with self._lock:
+            metadata = self._entries.get(path)
+            if metadata is not None:
+                self.hits += 1
+                return metadata
+        return self.refresh(path)
+    
+    def refresh(self, path: str) -> Optional[Tuple[bool, int, int]]:
+        """Stat a path again; None if it no longer exists"""
+        try:
+            stat_info = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return None
+        finally:
+            with self._lock:
+                self.misses += 1
+        is_dir = stat.S_ISDIR(stat_info.st_mode)
+        metadata = (is_dir, 0 if is_dir else stat_info.st_size, stat_info.st_mtime_ns)
+        with self._lock:
+            self._entries[path] = metadata
+        return metadata
+    
+    def discard(self, path: str):
+        """Drop a modified file"""
+        with self._lock:
+            self._entries.pop(path, None)
+    
+    def discard_directory(self, path: str):
+        """Drop a changed folder and the entries of its listing"""
+        with self._lock:
+            self._entries.pop(path, None)
+            self._drop_listing(path)
+    
+    def _drop_listing(self, dir_path: str):
+        stack = [dir_path]
+        while stack:
+            listing = self._listings.pop(stack.pop(), None)
+            if listing is None:
+                continue
+            for path in listing[1]:
+                self._entries.pop(path, None)
+                # Listings of subfolders that may be gone
+                stack.append(path)
+    
+    def clear(self):
+        """Drop all entries; the counters keep running for the session"""
+        with self._lock:
+            self._entries.clear()
+            self._listings.clear()
+    
+    def summary(self) -> str:
+        return (f"stat cache: {len(self._entries)} entries, {self.hits} stat calls saved, "
+                f"{self.misses} made")
+
+
+class DirectoryScanner:
+    """os.scandir based directory walker that reuses DirEntry type and stat information"""
+    
+    def __init__(self, ignore_list: List[str], include_hidden: bool, workers: int = 1,
+                 cached_listings: Optional[Dict] = None, use_gitignore: bool = False,
+                 root_directory: Optional[str] = None, stat_cache: Optional[StatCache] = None):
+        self.ignore_list = ignore_list
+        self.include_hidden = include_hidden
+        self.workers = max(1, workers)
+        self.use_gitignore = use_gitignore
+        self.root_directory = root_directory
+        self.should_cancel = False
+        # ignore.txt / GUI patterns apply from the root; .gitignore files add deeper levels
+        self.base_matcher = IgnoreMatcher((IgnoreRules(ignore_list),))
+        self._matchers = {}
+        # path -> stamp of the .gitignore files in effect there (0 without gitignore filtering)
+        self._rule_stamps = {}
+        # path -> (mtime_ns, rules_stamp, dirs, files) from a previous scan; None disables the index
+        self.cached_listings = cached_listings
+        # False re-lists every directory but still records listings for the index (manual refresh)
+        self.trust_index = True
+        self.listings = {}
+        self.relisted_paths = set()
+        # Receives the metadata of every listed entry
+        self.stat_cache = stat_cache
+    
+    def walk(self, root_directory: str):
+        """Walk the tree top-down, yielding (path, dir_entries, file_entries) like os.walk"""
+        if self.root_directory is None:
+            self.root_directory = root_directory
+        if self.workers > 1:
+            yield from self._walk_parallel(root_directory)
+            return
+        
+        stack = [root_directory]
+        while stack and not self.should_cancel:
+            path = stack.pop()
+            dirs, files = self.list_directory(path)
+            yield path, dirs, files
+            
+            # Symlinked directories are listed but not followed (same as os.walk)
+            stack.extend(entry.path for entry in reversed(dirs) if not entry.is_symlink())
+    
+    def _walk_parallel(self, root_directory: str):
+        """Walk with a pool of listing threads while yielding in the same order as walk()
+        
+        Sibling subdirectories are submitted to the pool as soon as their parent is
+        yielded, so on high-latency mounts their listings (and stat calls) run
+        concurrently while the consumer is still busy with earlier siblings.
+        """
+        pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scanner')
+        try:
+            stack = [(root_directory, pool.submit(self._list_and_stat, root_directory))]
+            while stack and not self.should_cancel:
+                path, future = stack.pop()
+                dirs, files = future.result()
+                yield path, dirs, files
+                
+                pending = [(entry.path, pool.submit(self._list_and_stat, entry.path))
+                           for entry in dirs if not entry.is_symlink()]
+                stack.extend(reversed(pending))
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _list_and_stat(self, path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """List a directory and warm the DirEntry stat cache on the worker thread"""
+        dirs, files = self.list_directory(path)
+        for entry in dirs + files:
+            try:
+                entry.stat()
+            except OSError:
+                pass
+        return dirs, files
+    
+    def list_directory(self, path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """List a single directory, returning filtered and sorted (dirs, files)
+        
+        With a scan index, directories whose mtime and .gitignore files are unchanged
+        are served from the index and only changed directories are listed again. Editing
+        a file in place does not change its directory's mtime, so the files of a reused
+        listing are stat'ed again.
+        """
+        if self.cached_listings is None:
+            dirs, files = self._scan_directory(path)
+            self.remember(path, None, dirs, files)
+            return dirs, files
+        
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError as e:
+            logging.debug(f"Cannot access {path}: {e}")
+            return [], []
+        
+        cached = self.cached_listings.get(path)
+        if cached is not None and cached[0] == mtime_ns and self.trust_index and \
+                cached[1] == self._rules_stamp(path):
+            dirs, files = cached[2], cached[3]
+            valid_files = self._revalidate_files(files)
+            if valid_files is not files:
+                self.relisted_paths.add(path)
+            self.listings[path] = (mtime_ns, cached[1], dirs, valid_files)
+            self.remember(path, mtime_ns, dirs, valid_files)
+            return dirs, valid_files
+        
+        dirs, files = self._scan_directory(path)
+        self.listings[path] = (mtime_ns, self._rule_stamps.get(path, 0), dirs, files)
+        self.relisted_paths.add(path)
+        self.remember(path, mtime_ns, dirs, files)
+        return dirs, files
+    
+    def remember(self, path: str, mtime_ns: Optional[int], dirs: List, files: List):
+        """Hand a listing to the stat cache; DirEntry keeps the stat result for the caller"""
+        if self.stat_cache is None:
+            return
+        entries = []
+        for entry in dirs + files:
+            try:
+                stat_info = entry.stat()
+            except OSError:
+                continue
+            is_dir = entry.is_dir()
+            entries.append((entry.path, is_dir, 0 if is_dir else stat_info.st_size, stat_info.st_mtime_ns))
+        self.stat_cache.put_listing(path, mtime_ns, entries)
+    
+    def _rules_stamp(self, path: str) -> int:
+        """Stamp of the .gitignore files that filter a directory's listing"""
+        if not self.use_gitignore:
+            return 0
+        self._matcher_for(path)
+        return self._rule_stamps.get(path, 0)
+    
+    @staticmethod
+    def _revalidate_files(files: List['CachedEntry']) -> List['CachedEntry']:
+        """Refresh size and mtime of indexed files; returns the same list if nothing changed"""
+        changed = False
+        valid = []
+        for entry in files:
+            try:
+                stat_info = os.stat(entry.path)
+            except OSError:
+                changed = True
+                continue
+            if stat_info.st_size != entry.st_size or stat_info.st_mtime_ns != entry.st_mtime_ns:
+                entry = CachedEntry(entry.name, entry.path, False, entry.is_symlink(),
+                                    stat_info.st_size, stat_info.st_mtime_ns)
+                changed = True
+            valid.append(entry)
+        return valid if changed else files
+    
+    def _scan_directory(self, path: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """Read a directory from disk with os.scandir"""
+        dirs = []
+        files = []
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except (OSError, PermissionError) as e:
+            logging.debug(f"Cannot list {path}: {e}")
+            return dirs, files
+        
+        matcher = self._matcher_for(path, any(entry.name == '.gitignore' for entry in entries))
+        rel_dir = self._relative(path)
+        prefix = rel_dir + '/' if rel_dir else ''
+        for entry in entries:
+            name = entry.name
+            if not self.include_hidden and name.startswith('.'):
+                continue
+            try:
+                # Type comes from the listing itself, so ignored entries are pruned before any stat
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if matcher.is_ignored(prefix + name, name, is_dir):
+                continue
+            (dirs if is_dir else files).append(entry)
+        
+        dirs.sort(key=lambda entry: entry.name.lower())
+        files.sort(key=lambda entry: entry.name.lower())
+        return dirs, files
+    
+    def create_item_data(self, entry: os.DirEntry, parent_path: str) -> Optional[Dict]:
+        """Create item data dictionary from a DirEntry, reusing its cached type and stat info"""
+        try:
+            is_dir = entry.is_dir()
+            stat_info = entry.stat()
+            return {
+                'name': entry.name,
+                'full_path': entry.path,
+                'is_dir': is_dir,
+                'size': 0 if is_dir else stat_info.st_size,
+                'mtime_ns': stat_info.st_mtime_ns,
+                'parent_path': parent_path
+            }
+        except (OSError, PermissionError) as e:
+            logging.debug(f"Cannot access {entry.path}: {e}")
+            return None
+    
+    def list_item_data(self, path: str) -> List[Dict]:
+        """List a single directory as item data dictionaries, directories first"""
+        dirs, files = self.list_directory(path)
+        items = [self.create_item_data(entry, path) for entry in dirs + files]
+        return [item for item in items if item]
+    
+    def should_ignore_path(self, path: str) -> bool:
+        """Check if a path should be ignored based on its name and the base patterns"""
+        item = os.path.basename(path)
+        
+        # Hidden files check
+        if not self.include_hidden and item.startswith('.'):
+            return True
+        
+        return self.base_matcher.is_ignored(item, item, False)
+    
+    def is_ignored_relative(self, rel_path: str, is_dir: bool) -> bool:
+        """Check a '/' separated path relative to the root against the base patterns"""
+        parts = rel_path.split('/')
+        for index, part in enumerate(parts):
+            if not self.include_hidden and part.startswith('.'):
+                return True
+            if self.base_matcher.is_ignored('/'.join(parts[:index + 1]), part, is_dir or index < len(parts) - 1):
+                return True
+        return False
+    
+    def _relative(self, path: str) -> str:
+        """Path relative to the root directory with '/' separators ('' for the root)"""
+        if self.root_directory is None:
+            self.root_directory = path
+        rel_path = os.path.relpath(path, self.root_directory)
+        return '' if rel_path == '.' else rel_path.replace(os.sep, '/')
+    
+    def _matcher_for(self, path: str, has_gitignore: Optional[bool] = None) -> IgnoreMatcher:
+        """Ignore rules in effect inside a directory, including all parent .gitignore files"""
+        matcher = self._matchers.get(path)
+        if matcher is not None:
+            return matcher
+        
+        rel_dir = self._relative(path)
+        if not self.use_gitignore:
+            matcher = self.base_matcher
+        else:
+            if rel_dir == '' or rel_dir.startswith('..'):
+                matcher = self.base_matcher
+                stamp = 0
+            else:
+                parent = os.path.dirname(path)
+                matcher = self._matcher_for(parent)
+                stamp = self._rule_stamps.get(parent, 0)
+            if has_gitignore is not False:
+                gitignore = self._read_gitignore(path, rel_dir)
+                if gitignore is not None:
+                    rules, mtime_ns = gitignore
+                    matcher = matcher.child(rules)
+                    stamp = hash((stamp, mtime_ns))
+            self._rule_stamps[path] = stamp
+        
+        self._matchers[path] = matcher
+        return matcher
+    
+    def _read_gitignore(self, path: str, rel_dir: str) -> Optional[Tuple[IgnoreRules, int]]:
+        """Rules of a directory's .gitignore and its mtime"""
+        try:
+            with open(os.path.join(path, '.gitignore'), 'r', encoding='utf-8', errors='replace') as f:
+                return IgnoreRules(f.read().splitlines(), rel_dir), os.fstat(f.fileno()).st_mtime_ns
+        except OSError:
+            return None
+
+
+class CachedEntry:
+    """Scan index record exposing the subset of the os.DirEntry interface the scanner uses"""
+    __slots__ = ('name', 'path', '_is_dir', '_is_symlink', 'st_size', 'st_mtime_ns')
+    
+    def __init__(self, name: str, path: str, is_dir: bool, is_symlink: bool, size: int, mtime_ns: int):
+        self.name = name
+        self.path = path
+        self._is_dir = is_dir
+        self._is_symlink = is_symlink
+        self.st_size = size
+        self.st_mtime_ns = mtime_ns
+    
+    @property
+    def st_mtime(self) -> float:
+        return self.st_mtime_ns / 1e9
+    
+    def is_dir(self) -> bool:
+        return self._is_dir
+    
+    def is_symlink(self) -> bool:
+        return self._is_symlink
+    
+    def stat(self):
+        return self
+
+
+class ScanIndex:
+    """Persistent SQLite index of directory listings, one set of rows per root directory"""
+    
+    # Bump when the stored columns change; older databases are emptied
+    VERSION = 2
+    
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        if conn.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+            conn.executescript(f"""
+                DROP TABLE IF EXISTS roots;
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS entries;
+                PRAGMA user_version = {self.VERSION};
+            """)
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS roots (
+                root TEXT PRIMARY KEY,
+                settings_key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS directories (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                rules_stamp INTEGER NOT NULL,
+                PRIMARY KEY (root, path)
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                root TEXT NOT NULL,
+                parent TEXT NOT NULL,
+                name TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                is_symlink INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_by_parent ON entries (root, parent);
+        """)
+        return conn
+    
+    def load(self, root: str, settings_key: str) -> Dict[str, Tuple[int, int, List[CachedEntry], List[CachedEntry]]]:
+        """Load all listings stored for root; empty if the scan settings changed"""
+        listings = {}
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT settings_key FROM roots WHERE root = ?", (root,)).fetchone()
+            if row is None or row[0] != settings_key:
+                return listings
+            
+            for path, mtime_ns, rules_stamp in conn.execute(
+                    "SELECT path, mtime_ns, rules_stamp FROM directories WHERE root = ?", (root,)):
+                listings[path] = (mtime_ns, rules_stamp, [], [])
+            
+            rows = conn.execute(
+                "SELECT parent, name, is_dir, is_symlink, size, mtime_ns FROM entries WHERE root = ? ORDER BY rowid",
+                (root,)
+            )
+            for parent, name, is_dir, is_symlink, size, mtime_ns in rows:
+                listing = listings.get(parent)
+                if listing is None:
+                    continue
+                entry = CachedEntry(name, os.path.join(parent, name), bool(is_dir), bool(is_symlink), size, mtime_ns)
+                listing[2 if is_dir else 3].append(entry)
+        finally:
+            conn.close()
+        return listings
+    
+    def save(self, root: str, settings_key: str, scanner: DirectoryScanner):
+        """Write back the directories the scanner re-listed and drop the ones that disappeared"""
+        previous = scanner.cached_listings or {}
+        removed = [path for path in previous if path not in scanner.listings]
+        if not scanner.relisted_paths and not removed:
+            return
+        
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute("SELECT settings_key FROM roots WHERE root = ?", (root,)).fetchone()
+                if row is None or row[0] != settings_key:
+                    conn.execute("DELETE FROM directories WHERE root = ?", (root,))
+                    conn.execute("DELETE FROM entries WHERE root = ?", (root,))
+                    conn.execute("INSERT OR REPLACE INTO roots (root, settings_key) VALUES (?, ?)", (root, settings_key))
+                
+                for path in removed:
+                    conn.execute("DELETE FROM directories WHERE root = ? AND path = ?", (root, path))
+                    conn.execute("DELETE FROM entries WHERE root = ? AND parent = ?", (root, path))
+                
+                for path in scanner.relisted_paths:
+                    mtime_ns, rules_stamp, dirs, files = scanner.listings[path]
+                    conn.execute("DELETE FROM entries WHERE root = ? AND parent = ?", (root, path))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO directories (root, path, mtime_ns, rules_stamp) VALUES (?, ?, ?, ?)",
+                        (root, path, mtime_ns, rules_stamp)
+                    )
+                    rows = []
+                    for entry in dirs + files:
+                        try:
+                            stat_info = entry.stat()
+                            rows.append((root, path, entry.name, int(entry.is_dir()), int(entry.is_symlink()),
+                                         stat_info.st_size, stat_info.st_mtime_ns))
+                        except OSError:
+                            continue
+                    conn.executemany(
+                        "INSERT INTO entries (root, parent, name, is_dir, is_symlink, size, mtime_ns) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows
+                    )
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def settings_key(ignore_list: List[str], include_hidden: bool, use_gitignore: bool = False) -> str:
+        """Key identifying the filter settings a stored listing was produced with"""
+        return json.dumps([sorted(ignore_list), include_hidden, use_gitignore])
+
+
+class GitFileLister:
+    """Enumerates a git work tree from the repository's file list instead of walking it
+    
+    Runs `git ls-files -z` (optionally with untracked, non-ignored files). Without
+    a git executable the tracked files are read from .git/index directly; the index
+    does not know untracked files, so those requests fall back to a directory walk.
+    """
+    GITLINK_MODE = 0o160000
+    
+    def __init__(self, scanner: DirectoryScanner, include_untracked: bool = False):
+        self.scanner = scanner
+        self.include_untracked = include_untracked
+    
+    def list_files(self, root_directory: str) -> Optional[List[Tuple[str, bool]]]:
+        """Return (relative path, is_submodule) for every listed file, or None outside git"""
+        command = ['git', 'ls-files', '-z', '--cached', '--stage']
+        if self.include_untracked:
+            command += ['--others', '--exclude-standard']
+        try:
+            result = subprocess.run(command, cwd=root_directory, capture_output=True, timeout=60,
+                                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        except FileNotFoundError:
+            if self.include_untracked:
+                logging.info("git not found, walking the directory to include untracked files")
+                return None
+            return self._read_index(root_directory)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.info(f"git ls-files failed, falling back to directory walk: {e}")
+            return None
+        if result.returncode != 0:
+            return None
+        
+        files = []
+        for record in result.stdout.split(b'\0'):
+            if not record:
+                continue
+            meta, tab, path = record.partition(b'\t')
+            if tab:
+                # Tracked: "<mode> <object> <stage>\t<path>"
+                files.append((os.fsdecode(path), int(meta.split(b' ', 1)[0], 8) == self.GITLINK_MODE))
+            else:
+                # Untracked files are listed as plain paths
+                files.append((os.fsdecode(record), False))
+        return files
+    
+    def _read_index(self, root_directory: str) -> Optional[List[Tuple[str, bool]]]:
+        """Read tracked paths from .git/index (versions 2 to 4)"""
+        top = os.path.abspath(root_directory)
+        while not os.path.exists(os.path.join(top, '.git')):
+            parent = os.path.dirname(top)
+            if parent == top:
+                return None
+            top = parent
+        
+        git_dir = os.path.join(top, '.git')
+        if os.path.isfile(git_dir):
+            # Linked work trees and submodules: ".git" is a file pointing to the real directory
+            with open(git_dir, 'r', encoding='utf-8') as f:
+                git_dir = os.path.join(top, f.read().strip().split('gitdir:', 1)[-1].strip())
+        try:
+            with open(os.path.join(git_dir, 'index'), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if data[:4] != b'DIRC':
+            return None
+        
+        version, count = struct.unpack('>II', data[4:12])
+        prefix = os.path.relpath(os.path.abspath(root_directory), top).replace(os.sep, '/')
+        prefix = '' if prefix == '.' else prefix + '/'
+        
+        files = []
+        offset = 12
+        previous = b''
+        for _ in range(count):
+            start = offset
+            mode = struct.unpack('>I', data[offset + 24:offset + 28])[0]
+            flags = struct.unpack('>H', data[offset + 60:offset + 62])[0]
+            offset += 62
+            if version >= 3 and flags & 0x4000:
+                offset += 2
+            if version >= 4:
+                # Path is stored as "strip N bytes from the previous path" + NUL-terminated suffix
+                byte = data[offset]
+                offset += 1
+                strip = byte & 0x7f
+                while byte & 0x80:
+                    byte = data[offset]
+                    offset += 1
+                    strip = ((strip + 1) << 7) | (byte & 0x7f)
+                end = data.index(b'\0', offset)
+                path = previous[:len(previous) - strip] + data[offset:end]
+                offset = end + 1
+            else:
+                end = data.index(b'\0', offset)
+                path = data[offset:end]
+                offset = start + ((end - start + 8) // 8) * 8
+            previous = path
+            
+            rel_path = path.decode('utf-8', errors='surrogateescape')
+            if rel_path.startswith(prefix):
+                files.append((rel_path[len(prefix):], mode == self.GITLINK_MODE))
+        return files
+    
+    def walk(self, root_directory: str):
+        """Yield (path, dir_entries, file_entries) in the same order as DirectoryScanner.walk"""
+        files = self.list_files(root_directory)
+        if files is None:
+            return None
+        # Conflicted paths are listed once per merge stage
+        return self._walk_listed(root_directory, list(dict.fromkeys(files)))
+    
+    def _walk_listed(self, root_directory: str, files: List[Tuple[str, bool]]):
+        # Build the folder structure from the listed paths, applying the ignore patterns
+        children = {'': (set(), [])}
+        submodules = set()
+        for rel_path, is_submodule in files:
+            parts = rel_path.split('/')
+            if self.scanner.is_ignored_relative(rel_path, is_submodule):
+                continue
+            parent = ''
+            for part in parts[:-1]:
+                current = parent + '/' + part if parent else part
+                if current not in children:
+                    children[current] = (set(), [])
+                    children[parent][0].add(part)
+                parent = current
+            if is_submodule:
+                submodules.add(rel_path)
+                if rel_path not in children:
+                    children[rel_path] = (set(), [])
+                    children[parent][0].add(parts[-1])
+            else:
+                children[parent][1].append(parts[-1])
+        
+        stack = ['']
+        while stack and not self.scanner.should_cancel:
+            rel_dir = stack.pop()
+            dir_path = os.path.join(root_directory, *rel_dir.split('/')) if rel_dir else root_directory
+            if rel_dir in submodules:
+                # Submodule contents are not in this repository's list; walk them instead
+                yield from self.scanner.walk(dir_path)
+                continue
+            
+            dir_names, file_names = children[rel_dir]
+            dirs = self._entries(dir_path, sorted(dir_names, key=str.lower), True)
+            file_entries = self._entries(dir_path, sorted(file_names, key=str.lower), False)
+            self.scanner.remember(dir_path, None, dirs, file_entries)
+            yield dir_path, dirs, file_entries
+            
+            stack.extend(f"{rel_dir}/{entry.name}" if rel_dir else entry.name for entry in reversed(dirs))
+    
+    def _entries(self, dir_path: str, names: List[str], is_dir: bool) -> List[CachedEntry]:
+        entries = []
+        for name in names:
+            full_path = os.path.join(dir_path, name)
+            try:
+                stat_info = os.stat(full_path)
+            except OSError:
+                # Deleted in the work tree but still in the index
+                continue
+            entries.append(CachedEntry(name, full_path, is_dir, False, stat_info.st_size, stat_info.st_mtime_ns))
+        return entries
+
+
+class ScanChunk:
+    """Batch of scan results sent from the loader thread, stored as parallel arrays
+    
+    Entries are numbered in scan order across the whole scan; `parents` holds the
+    number of each entry's folder (-1 for the root) instead of a path string.
+    """
+    __slots__ = ('start', 'names', 'parents', 'is_dir', 'sizes', 'mtimes')
+    
+    def __init__(self, start: int):
+        self.start = start
+        self.names = []
+        self.parents = array('q')
+        self.is_dir = bytearray()
+        self.sizes = array('q')
+        self.mtimes = array('q')
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def append(self, name: str, parent: int, is_dir: bool, size: int, mtime_ns: int):
+        self.names.append(name)
+        self.parents.append(parent)
+        self.is_dir.append(is_dir)
+        self.sizes.append(size)
+        self.mtimes.append(mtime_ns)
+
+
+class FileIndex:
+    """All entries of one scan in parallel arrays; only folder paths are kept as strings
+    
+    The scanner lists each folder in one go, so the children of a folder are a
+    contiguous range of entries described by `first_child` and `child_count`.
+    Entries the widget tree adds after the scan are appended without joining a
+    child range, and removed entries are only marked in `removed`; children() and
+    row() skip them, while child_range() still covers the whole contiguous range.
+    """
+    
+    def __init__(self, root_directory: str):
+        self.root_directory = root_directory
+        self.names = []
+        self.parents = array('q')
+        self.is_dir = bytearray()
+        self.sizes = array('q')
+        self.mtimes = array('q')
+        self.first_child = array('q')
+        self.child_count = array('q')
+        self.removed = bytearray()
+        self.removed_count = 0
+        self.files = 0
+        self.root_first_child = 0
+        self.root_child_count = 0
+        self.dir_paths = {-1: root_directory}
+    
+    def __len__(self) -> int:
+        return len(self.names)
+    
+    def extend(self, chunk: ScanChunk):
+        """Append a chunk and resolve the paths of the folders it contains"""
+        self.names.extend(chunk.names)
+        self.parents.extend(chunk.parents)
+        self.is_dir.extend(chunk.is_dir)
+        self.sizes.extend(chunk.sizes)
+        self.mtimes.extend(chunk.mtimes)
+        self.first_child.extend(array('q', [0]) * len(chunk))
+        self.child_count.extend(array('q', [0]) * len(chunk))
+        self.removed.extend(bytes(len(chunk)))
+        self.files += len(chunk) - chunk.is_dir.count(1)
+        
+        dir_paths = self.dir_paths
+        first_child, child_count = self.first_child, self.child_count
+        for offset, parent in enumerate(chunk.parents):
+            index = chunk.start + offset
+            if parent < 0:
+                if not self.root_child_count:
+                    self.root_first_child = index
+                self.root_child_count += 1
+            else:
+                if not child_count[parent]:
+                    first_child[parent] = index
+                child_count[parent] += 1
+            if chunk.is_dir[offset]:
+                dir_paths[index] = os.path.join(dir_paths[parent], chunk.names[offset])
+    
+    def child_range(self, index: int) -> range:
+        """Entry numbers of the children of a folder (-1 for the root)"""
+        if index < 0:
+            return range(self.root_first_child, self.root_first_child + self.root_child_count)
+        return range(self.first_child[index], self.first_child[index] + self.child_count[index])
+    
+    def children(self, index: int):
+        """Entry numbers of the children of a folder (-1 for the root) that were not removed"""
+        children = self.child_range(index)
+        if not self.removed_count:
+            return children
+        removed = self.removed
+        return [child for child in children if not removed[child]]
+    
+    def row(self, index: int) -> int:
+        """Position of an entry among its siblings that were not removed"""
+        start = self.child_range(self.parents[index]).start
+        if not self.removed_count:
+            return index - start
+        return index - start - self.removed[start:index].count(1)
+    
+    def file_count(self) -> int:
+        return self.files
+    
+    def append(self, parent: int, name: str, is_dir: bool, size: int, mtime_ns: int) -> int:
+        """Add an entry found after the scan and return its number"""
+        index = len(self.names)
+        self.names.append(name)
+        self.parents.append(parent)
+        self.is_dir.append(is_dir)
+        self.sizes.append(0 if is_dir else size)
+        self.mtimes.append(mtime_ns)
+        self.first_child.append(0)
+        self.child_count.append(0)
+        self.removed.append(0)
+        if is_dir:
+            self.dir_paths[index] = os.path.join(self.dir_paths[parent], name)
+        else:
+            self.files += 1
+        return index
+    
+    def remove(self, index: int):
+        """Mark an entry deleted from disk; entries below a folder are removed one by one"""
+        if not self.removed[index]:
+            self.removed[index] = 1
+            self.removed_count += 1
+            if not self.is_dir[index]:
+                self.files -= 1
+    
+    def update(self, index: int, size: int, mtime_ns: int):
+        self.sizes[index] = size
+        self.mtimes[index] = mtime_ns
+    
+    def find(self, full_path: str) -> Optional[int]:
+        """Entry number of a path below the root directory (-1 for the root itself)"""
+        rel_path = os.path.relpath(full_path, self.root_directory)
+        index = -1
+        if rel_path == '.':
+            return index
+        for part in rel_path.split(os.sep):
+            index = next((child for child in self.child_range(index)
+                          if self.names[child] == part and not self.removed[child]), None)
+            if index is None:
+                return None
+        return index
+    
+    def parent_path(self, index: int) -> str:
+        return self.dir_paths[self.parents[index]]
+    
+    def path(self, index: int) -> str:
+        if self.is_dir[index]:
+            return self.dir_paths[index]
+        return os.path.join(self.dir_paths[self.parents[index]], self.names[index])
+
+
+class NameIndex:
+    """Lowercased entry names with trigram postings, for substring search over a tree
+    
+    Entries are numbered like a FileIndex, with `parents` holding each entry's folder
+    (-1 for the root). A query of three or more characters only checks the entries
+    listed under all of its trigrams.
+    """
+    
+    def __init__(self, names: List[str], parents, paths: Optional[List[str]] = None):
+        self.names = [name.lower() for name in names]
+        self.parents = parents
+        # Set when built from tree item paths; results are then reported as paths
+        self.paths = paths
+        postings = {}
+        for number, name in enumerate(self.names):
+            for trigram in {name[i:i + 3] for i in range(len(name) - 2)}:
+                postings.setdefault(trigram, []).append(number)
+        self.postings = {trigram: array('i', numbers) for trigram, numbers in postings.items()}
+    
+    @classmethod
+    def from_paths(cls, paths: List[str]) -> 'NameIndex':
+        numbers = {path: number for number, path in enumerate(paths)}
+        parents = array('q', (numbers.get(os.path.dirname(path), -1) for path in paths))
+        return cls([os.path.basename(path) for path in paths], parents, paths)
+    
+    def search(self, text: str, candidates=None) -> List[int]:
+        """Numbers of the entries whose name contains `text`, optionally only among `candidates`"""
+        text = text.lower()
+        if candidates is None:
+            if len(text) >= 3:
+                postings = sorted((self.postings.get(text[i:i + 3], ()) for i in range(len(text) - 2)), key=len)
+                found = set(postings[0])
+                for numbers in postings[1:]:
+                    if not found:
+                        break
+                    found.intersection_update(numbers)
+                candidates = sorted(found)
+            else:
+                candidates = range(len(self.names))
+        names = self.names
+        return [number for number in candidates if text in names[number]]
+    
+    def with_ancestors(self, matches: List[int]) -> set:
+        """The matches plus every folder above them"""
+        visible = set()
+        parents = self.parents
+        for number in matches:
+            while number >= 0 and number not in visible:
+                visible.add(number)
+                number = parents[number]
+        return visible
+
+
+class PathFinderIndex:
+    """Relative file paths in one lowercased text block, for fzf-style fuzzy matching
+    
+    Candidates are found with regular expressions over the block: the query inside a
+    file name, then anywhere in a path, then its characters in order. At most
+    CANDIDATE_LIMIT of them are scored in Python, so queries stay fast on very large
+    trees. Scores favour consecutive characters, word starts, file names, short paths
+    and recently modified files.
+    """
+    CANDIDATE_LIMIT = 2000
+    WORD_SEPARATORS = '/_-. '
+    
+    def __init__(self, root_directory: str, paths: List[str], mtimes):
+        prefix = len(root_directory.rstrip(os.sep)) + 1
+        self.paths = paths
+        self.rel_paths = [path[prefix:].replace(os.sep, '/') for path in paths]
+        self.lowered = [rel_path.lower() for rel_path in self.rel_paths]
+        self.mtimes = mtimes
+        self.text = '\n'.join(self.lowered) + '\n'
+        # Offset of each path in the text block
+        self.starts = array('q', accumulate((len(rel_path) + 1 for rel_path in self.lowered), initial=0))
+    
+    def __len__(self) -> int:
+        return len(self.paths)
+    
+    def candidates(self, query: str, enough: int = 0) -> Tuple[List[int], bool]:
+        """Numbers of paths that contain the query's characters in order, best kinds of match first
+        
+        The scattered-character pass is skipped once `enough` contiguous matches are found.
+        The flag tells whether the list holds every matching path.
+        """
+        patterns = (
+            re.escape(query) + r'[^/\n]*$',
+            re.escape(query),
+            # Each gap excludes the character that ends it, so there is no backtracking
+            re.escape(query[0]) + ''.join(f'[^\n{re.escape(char)}]*{re.escape(char)}' for char in query[1:]),
+        )
+        found = {}
+        for pass_number, pattern in enumerate(patterns):
+            if pass_number == 2 and enough and len(found) >= enough:
+                return list(found), False
+            for match in re.finditer(pattern, self.text, re.MULTILINE):
+                found[bisect_right(self.starts, match.start()) - 1] = None
+                if len(found) >= self.CANDIDATE_LIMIT:
+                    return list(found), False
+        return list(found), True
+    
+    def matches(self, number: int, query: str) -> bool:
+        """Whether a path contains the query's characters in order"""
+        chars = iter(self.lowered[number])
+        return all(char in chars for char in query)
+    
+    def score(self, number: int, query: str, now_ns: int) -> Optional[float]:
+        """Match quality of one path, None if the query's characters are not all in it"""
+        text = self.lowered[number]
+        # Matched from the end, so the query lands in the file name where it can
+        positions = []
+        position = len(text)
+        for char in reversed(query):
+            position = text.rfind(char, 0, position)
+            if position < 0:
+                return None
+            positions.append(position)
+        positions.reverse()
+        
+        name_start = text.rfind('/') + 1
+        score = 0.0
+        previous = None
+        for position in positions:
+            score += 1.0
+            if previous is not None:
+                if position == previous + 1:
+                    score += 4.0
+                else:
+                    score -= min(position - previous - 1, 20) * 0.1
+            if position == 0 or text[position - 1] in self.WORD_SEPARATORS:
+                score += 3.0
+            if position >= name_start:
+                score += 1.0
+            previous = position
+        
+        score -= len(text) * 0.02
+        # Up to 2 points for files modified in the last days
+        age_days = max(0, now_ns - self.mtimes[number]) / 86_400e9
+        return score + 2.0 / (1.0 + age_days / 7)
+    
+    def search(self, query: str, limit: int = 50, candidates: Optional[List[int]] = None) -> List[int]:
+        """Numbers of the best `limit` matches, best first"""
+        if candidates is None:
+            candidates, _ = self.candidates(query, limit)
+        now_ns = time.time_ns()
+        scored = ((self.score(number, query, now_ns), number) for number in candidates)
+        return [number for score, number in heapq.nlargest(limit, ((score, number) for score, number in scored
+                                                                     if score is not None))]
+
+
+class SelectionNode:
+    __slots__ = ('children', 'rule')
+    
+    def __init__(self, rule: Optional[bool] = None):
+        self.children = {}
+        self.rule = rule
+
+
+class SelectionTrie:
+    """Selected files as include/exclude rules on a trie of relative path components
+    
+    A rule on a folder applies to everything below it until a deeper rule overrides
+    it, so "src included except src/tests" is two nodes however many files there are.
+    Rules equal to the inherited value are dropped, which means a node with children
+    always marks a folder whose contents are only partly selected.
+    """
+    
+    def __init__(self, included: bool = True):
+        self.root = SelectionNode(included)
+    
+    @staticmethod
+    def split(rel_path: str) -> List[str]:
+        return [part for part in rel_path.replace(os.sep, '/').split('/') if part and part != '.']
+    
+    def set(self, rel_path: str, included: bool):
+        """Include or exclude a path together with everything below it"""
+        parts = self.split(rel_path)
+        node = self.root
+        inherited = node.rule
+        chain = []
+        for part in parts:
+            chain.append((node, part))
+            node = node.children.setdefault(part, SelectionNode())
+            if node.rule is not None and len(chain) < len(parts):
+                inherited = node.rule
+        
+        node.children = {}
+        node.rule = included if not chain or included != inherited else None
+        
+        # Drop nodes that no longer carry a rule
+        for parent, part in reversed(chain):
+            child = parent.children[part]
+            if child.rule is not None or child.children:
+                break
+            del parent.children[part]
+    
+    def is_included(self, rel_path: str) -> bool:
+        """Whether a file is selected"""
+        node = self.root
+        included = node.rule
+        for part in self.split(rel_path):
+            node = node.children.get(part)
+            if node is None:
+                break
+            if node.rule is not None:
+                included = node.rule
+        return included
+    
+    def subtree_rule(self, rel_path: str) -> Optional[bool]:
+        """True or False if everything at and below a path is included or excluded, None if mixed"""
+        node = self.root
+        included = node.rule
+        for part in self.split(rel_path):
+            node = node.children.get(part)
+            if node is None:
+                return included
+            if node.rule is not None:
+                included = node.rule
+        return None if node.children else included
+    
+    def rules(self) -> List[List]:
+        """All rules as [relative path, included] pairs, parents before children"""
+        result = []
+        stack = [('', self.root)]
+        while stack:
+            path, node = stack.pop()
+            if node.rule is not None:
+                result.append([path, node.rule])
+            for name in sorted(node.children, reverse=True):
+                stack.append((f"{path}/{name}" if path else name, node.children[name]))
+        return result
+    
+    @classmethod
+    def from_rules(cls, rules: List[List]) -> 'SelectionTrie':
+        trie = cls()
+        for path, included in sorted(rules, key=lambda rule: len(cls.split(rule[0]))):
+            trie.set(path, bool(included))
+        return trie
+    
+    @classmethod
+    def from_selected_files(cls, selected_files: List[str]) -> 'SelectionTrie':
+        """Build rules from a list of selected files (project files of earlier versions)"""
+        trie = cls(included=False)
+        for rel_path in selected_files:
+            trie.set(rel_path, True)
+        return trie
+    
+    def copy(self) -> 'SelectionTrie':
+        return self.from_rules(self.rules())
+
+
+class FileTreeModel(QAbstractItemModel):
+    """Item model over a FileIndex for very large trees
+    
+    Model indexes carry the entry number as their internal id. Check states live in
+    one byte per entry; text, sizes, dates and icons are only produced in data(),
+    i.e. for the rows the view actually paints.
+    """
+    HEADERS = ['Name', 'Size', 'Modified']
+    
+    def __init__(self, file_index: FileIndex, selection: SelectionTrie, folder_icon: QIcon, file_icon: QIcon,
+                 format_size, format_mtime, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.file_index = file_index
+        # Shared with the window; toggles in the view are recorded as rules
+        self.selection = selection
+        self.check_states = bytearray([Qt.Checked]) * len(file_index)
+        self.folder_icon = folder_icon
+        self.file_icon = file_icon
+        self.format_size = format_size
+        self.format_mtime = format_mtime
+        self.apply_selection()
+    
+    def entry(self, index: QModelIndex) -> int:
+        return index.internalId() if index.isValid() else -1
+    
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        children = self.file_index.children(self.entry(parent))
+        if not 0 <= row < len(children) or not 0 <= column < len(self.HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column, children[row])
+    
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        parent = self.file_index.parents[index.internalId()]
+        if parent < 0:
+            return QModelIndex()
+        return self.createIndex(self.file_index.row(parent), 0, parent)
+    
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        entry = self.entry(parent)
+        if entry >= 0 and not self.file_index.is_dir[entry]:
+            return 0
+        return len(self.file_index.children(entry))
+    
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return len(self.HEADERS)
+    
+    def headerData(self, section: int, orientation, role: int = Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+    
+    def flags(self, index: QModelIndex):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == 0:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+    
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = index.internalId()
+        column = index.column()
+        file_index = self.file_index
+        is_dir = bool(file_index.is_dir[entry])
+        
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return file_index.names[entry]
+            if column == 1:
+                return "" if is_dir else self.format_size(file_index.sizes[entry])
+            return self.format_mtime(file_index.mtimes[entry])
+        if column != 0:
+            return None
+        if role == Qt.CheckStateRole:
+            return self.check_states[entry]
+        if role == Qt.DecorationRole:
+            return self.folder_icon if is_dir else self.file_icon
+        if role == Qt.UserRole:
+            return file_index.path(entry)
+        if role == IS_DIR_ROLE:
+            return is_dir
+        return None
+    
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if not index.isValid() or index.column() != 0 or role != Qt.CheckStateRole:
+            return False
+        state = Qt.Checked if int(value) == Qt.Checked else Qt.Unchecked
+        entry = index.internalId()
+        self.selection.set(os.path.relpath(self.file_index.path(entry), self.file_index.root_directory),
+                           state == Qt.Checked)
+        self.set_check_state(entry, state)
+        return True
+    
+    def set_check_state(self, entry: int, state: int):
+        """Check or uncheck an entry with everything below it, then update its ancestors"""
+        file_index = self.file_index
+        self.check_states[entry] = state
+        self._emit_row_changed(entry)
+        
+        stack = [entry]
+        while stack:
+            current = stack.pop()
+            if not file_index.is_dir[current]:
+                continue
+            children = file_index.child_range(current)
+            if children:
+                self.check_states[children.start:children.stop] = bytes([state]) * len(children)
+                self._emit_children_changed(current)
+                stack.extend(child for child in children if file_index.is_dir[child])
+        
+        parent = file_index.parents[entry]
+        while parent >= 0:
+            self.check_states[parent] = self._state_from_children(parent)
+            self._emit_row_changed(parent)
+            parent = file_index.parents[parent]
+    
+    def set_all(self, state: int):
+        """Check or uncheck every entry"""
+        self.selection.set('', state == Qt.Checked)
+        self.check_states[:] = bytes([state]) * len(self.check_states)
+        self._emit_all_changed()
+    
+    def apply_selection(self):
+        """Set every entry's state from the selection rules"""
+        file_index = self.file_index
+        root_rule = self.selection.subtree_rule('')
+        if root_rule is not None:
+            self.check_states[:] = bytes([Qt.Checked if root_rule else Qt.Unchecked]) * len(self.check_states)
+            self._emit_all_changed()
+            return
+        
+        # Rules are only looked up below partly selected folders
+        dir_rules = {-1: None}
+        for entry in range(len(file_index)):
+            is_dir = file_index.is_dir[entry]
+            rule = dir_rules[file_index.parents[entry]]
+            if rule is None:
+                rel_path = os.path.relpath(file_index.path(entry), file_index.root_directory)
+                rule = self.selection.subtree_rule(rel_path) if is_dir else self.selection.is_included(rel_path)
+            self.check_states[entry] = Qt.PartiallyChecked if rule is None else Qt.Checked if rule else Qt.Unchecked
+            if is_dir:
+                dir_rules[entry] = rule
+        self.update_directory_states()
+    
+    def update_directory_states(self):
+        """Derive every folder's state from its children after file states were set directly"""
+        # Children always come after their folder in scan order
+        for entry in sorted(self.file_index.dir_paths, reverse=True):
+            if entry >= 0 and self.file_index.child_count[entry]:
+                self.check_states[entry] = self._state_from_children(entry)
+        self._emit_all_changed()
+    
+    def refresh_entry(self, entry: int, size: int, mtime_ns: int):
+        """Update size and modification time of a file changed on disk"""
+        self.file_index.update(entry, size, mtime_ns)
+        row = self.file_index.row(entry)
+        parent = self.file_index.parents[entry]
+        parent_index = QModelIndex() if parent < 0 else self.createIndex(self.file_index.row(parent), 0, parent)
+        self.dataChanged.emit(self.index(row, 1, parent_index), self.index(row, 2, parent_index))
+    
+    def _state_from_children(self, entry: int) -> int:
+        file_index = self.file_index
+        children = file_index.child_range(entry)
+        states = self.check_states[children.start:children.stop]
+        if file_index.removed_count:
+            removed = file_index.removed[children.start:children.stop]
+            states = bytes(state for state, gone in zip(states, removed) if not gone)
+            if not states:
+                return self.check_states[entry]
+        checked = states.count(Qt.Checked)
+        if checked == len(states):
+            return Qt.Checked
+        if checked == 0 and states.count(Qt.PartiallyChecked) == 0:
+            return Qt.Unchecked
+        return Qt.PartiallyChecked
+    
+    def entry_index(self, entry: int) -> QModelIndex:
+        return self.createIndex(self.file_index.row(entry), 0, entry)
+    
+    def _emit_row_changed(self, entry: int):
+        index = self.entry_index(entry)
+        self.dataChanged.emit(index, index, [Qt.CheckStateRole])
+    
+    def _emit_children_changed(self, entry: int):
+        count = len(self.file_index.children(entry))
+        if not count:
+            return
+        parent_index = QModelIndex() if entry < 0 else self.createIndex(self.file_index.row(entry), 0, entry)
+        self.dataChanged.emit(self.index(0, 0, parent_index), self.index(count - 1, 0, parent_index),
+                              [Qt.CheckStateRole])
+    
+    def _emit_all_changed(self):
+        for entry in self.file_index.dir_paths:
+            if len(self.file_index.child_range(entry)):
+                self._emit_children_changed(entry)
+
+
+class EntryFilterProxyModel(QSortFilterProxyModel):
+    """Shows only the FileTreeModel entries found by the name search (all while None)"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.visible_entries = None
+    
+    def set_visible_entries(self, entries: Optional[set]):
+        self.visible_entries = entries
+        self.invalidateFilter()
+    
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self.visible_entries is None:
+            return True
+        model = self.sourceModel()
+        return model.file_index.children(model.entry(source_parent))[source_row] in self.visible_entries
+
+
+class TreeLoaderThread(QThread):
+    """Background thread for loading file tree with optimal performance"""
+    progress_updated = pyqtSignal(int)
+    status_updated = pyqtSignal(str)
+    tree_data_chunk = pyqtSignal(object)
+    tree_loaded = pyqtSignal(list)
+    loading_finished = pyqtSignal(bool)
+    
+    def __init__(self, root_directory: str, ignore_list: List[str], include_hidden: bool, scan_workers: int = 1,
+                 index_path: Optional[str] = None, lazy: bool = False, use_git: bool = False,
+                 include_untracked: bool = False, use_gitignore: bool = False,
+                 stat_cache: Optional[StatCache] = None, refresh: bool = False):
+        super().__init__()
+        self.root_directory = root_directory
+        self.ignore_list = ignore_list
+        self.include_hidden = include_hidden
+        self.lazy = lazy
+        self.use_git = use_git
+        self.include_untracked = include_untracked
+        self.should_cancel = False
+        self.scanner = DirectoryScanner(ignore_list, include_hidden, scan_workers, use_gitignore=use_gitignore,
+                                        root_directory=root_directory, stat_cache=stat_cache)
+        # Files edited in place keep their folder's mtime, so a manual refresh reads every folder again
+        self.scanner.trust_index = not refresh
+        # A lazy scan only sees the top level, so it must not rewrite the index
+        self.scan_index = ScanIndex(index_path) if index_path and not lazy else None
+        
+    def run(self):
+        """Main thread execution"""
+        try:
+            self.load_tree_data()
+        except Exception as e:
+            logging.error(f"Tree loading error: {str(e)}", exc_info=True)
+            self.loading_finished.emit(False)
+    
+    def cancel(self):
+        """Cancel the loading operation"""
+        self.should_cancel = True
+        self.scanner.should_cancel = True
+
+    def load_tree_data(self):
+        """Load all file tree data in a single efficient pass"""
+        self.status_updated.emit("Scanning directory structure...")
+        
+        chunk = ScanChunk(0)
+        chunk_size = 100
+        processed_items = 0
+        # Scan number of each folder whose listing is still to come
+        dir_indices = {self.root_directory: -1}
+        
+        index_root = os.path.abspath(self.root_directory)
+        settings_key = ScanIndex.settings_key(self.ignore_list, self.include_hidden, self.scanner.use_gitignore)
+        if self.scan_index:
+            try:
+                self.scanner.cached_listings = self.scan_index.load(index_root, settings_key)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not read scan index: {e}")
+                self.scanner.cached_listings = {}
+        
+        walker = None
+        if self.lazy:
+            # Only the top level; deeper folders are listed when expanded
+            walker = [(self.root_directory, *self.scanner.list_directory(self.root_directory))]
+        elif self.use_git:
+            walker = GitFileLister(self.scanner, self.include_untracked).walk(self.root_directory)
+            if walker is not None:
+                self.status_updated.emit("Reading file list from git...")
+                # The git listing does not go through the scan index
+                self.scan_index = None
+        if walker is None:
+            walker = self.scanner.walk(self.root_directory)
+        
+        try:
+            for root, dirs, files in walker:
+                if self.should_cancel:
+                    break
+                
+                parent = dir_indices.pop(root, None)
+                if parent is None:
+                    # The folder itself could not be stat'ed
+                    continue
+                
+                # Directories first, then files - both already sorted by the scanner
+                for entry in dirs + files:
+                    if self.should_cancel:
+                        break
+                    
+                    try:
+                        is_dir = entry.is_dir()
+                        stat_info = entry.stat()
+                    except OSError as e:
+                        logging.debug(f"Cannot access {entry.path}: {e}")
+                        continue
+                    if is_dir:
+                        dir_indices[entry.path] = chunk.start + len(chunk)
+                    chunk.append(entry.name, parent, is_dir, 0 if is_dir else stat_info.st_size,
+                                 stat_info.st_mtime_ns)
+
+                processed_items += len(dirs) + len(files)
+                self.status_updated.emit(f"Found {processed_items} items...")
+
+                # Emit chunk if we have enough items
+                if len(chunk) >= chunk_size:
+                    self.tree_data_chunk.emit(chunk)
+                    chunk = ScanChunk(chunk.start + len(chunk))
+
+            # Emit any remaining data
+            if len(chunk) and not self.should_cancel:
+                self.tree_data_chunk.emit(chunk)
+            
+            if not self.should_cancel:
+                self.tree_loaded.emit([])
+                self.loading_finished.emit(True)
+                
+                if self.scan_index:
+                    self.scan_index.save(index_root, settings_key, self.scanner)
+                    logging.info(f"Scan index updated: {len(self.scanner.relisted_paths)} of "
+                                 f"{len(self.scanner.listings)} directories re-listed")
+            
+        except sqlite3.Error as e:
+            logging.warning(f"Could not update scan index: {e}")
+        except Exception as e:
+            logging.error(f"Error loading tree data: {str(e)}")
+            self.loading_finished.emit(False)
+
+class DirectoryPrefetchThread(QThread):
+    """Low-priority background thread listing folders ahead of the user in lazy mode"""
+    listing_ready = pyqtSignal(str, list)
+    
+    def __init__(self, scanner: DirectoryScanner):
+        super().__init__()
+        self.scanner = scanner
+        self.requests = queue.Queue()
+        self.should_cancel = False
+    
+    def run(self):
+        """Main thread execution"""
+        while not self.should_cancel:
+            request = self.requests.get()
+            if request is None:
+                break
+            path, levels = request
+            try:
+                items = self.scanner.list_item_data(path)
+            except Exception as e:
+                logging.debug(f"Prefetch failed for {path}: {e}")
+                continue
+            if self.should_cancel:
+                break
+            self.listing_ready.emit(path, items)
+            
+            if levels > 1:
+                for item_data in items:
+                    if item_data['is_dir']:
+                        self.requests.put((item_data['full_path'], levels - 1))
+    
+    def prefetch(self, paths: List[str], levels: int = 1):
+        """Queue folders to be listed, optionally including their next levels"""
+        for path in paths:
+            self.requests.put((path, levels))
+    
+    def cancel(self):
+        """Cancel the prefetching"""
+        self.should_cancel = True
+        self.scanner.should_cancel = True
+        self.requests.put(None)
+
+
+class NameSearchThread(QThread):
+    """Background thread answering tree filter queries from a NameIndex
+    
+    Requests are coalesced, so only the newest index and query are worked on. A query
+    that extends the previous one only re-checks the previous matches.
+    """
+    results_ready = pyqtSignal(int, object)
+    
+    def __init__(self):
+        super().__init__()
+        self.requests = queue.Queue()
+        self.should_cancel = False
+        self.index = None
+        self.last_text = ''
+        self.last_matches = None
+        # For an index of paths: all of them, and the hidden paths of the previous answer
+        self.all_paths = None
+        self.last_hidden = set()
+    
+    def run(self):
+        """Main thread execution"""
+        while not self.should_cancel:
+            requests = [self.requests.get()]
+            while not self.requests.empty():
+                requests.append(self.requests.get_nowait())
+            if None in requests:
+                break
+            
+            builds = [request[1] for request in requests if request[0] == 'build']
+            searches = [request for request in requests if request[0] == 'search']
+            try:
+                if builds:
+                    self.index = builds[-1]()
+                    self.last_text, self.last_matches = '', None
+                    self.all_paths = None
+                if not searches or self.index is None:
+                    continue
+                
+                _, generation, text = searches[-1]
+                self.results_ready.emit(generation, self.answer(text))
+            except Exception as e:
+                logging.error(f"Search failed: {e}")
+    
+    def answer(self, text: str):
+        """The matches plus their folders as entry numbers, or (hidden, changed, previous hidden) paths
+        
+        For an index of paths the hidden paths and those whose visibility changed since the
+        previous answer are worked out here, so the GUI thread only toggles the changed items.
+        """
+        narrowing = self.last_matches is not None and self.last_text and self.last_text.lower() in text.lower()
+        matches = self.index.search(text, self.last_matches if narrowing else None)
+        self.last_text, self.last_matches = text, matches
+        
+        visible = self.index.with_ancestors(matches)
+        if self.index.paths is None:
+            return visible
+        paths = self.index.paths
+        if self.all_paths is None:
+            self.all_paths = set(paths)
+        hidden = self.all_paths - {paths[number] for number in visible}
+        previous, self.last_hidden = self.last_hidden, hidden
+        return hidden, hidden ^ previous, previous
+    
+    def rebuild(self, build):
+        """Replace the index with the NameIndex returned by `build`, called on this thread"""
+        self.requests.put(('build', build))
+    
+    def search(self, generation: int, text: str):
+        self.requests.put(('search', generation, text))
+    
+    def cancel(self):
+        """Stop the thread"""
+        self.should_cancel = True
+        self.requests.put(None)
+
+
+class PathFinderThread(NameSearchThread):
+    """Background thread ranking fuzzy path queries against a PathFinderIndex"""
+    RESULT_LIMIT = 50
+    last_complete = False
+    
+    def answer(self, text: str):
+        """(full path, relative path) of the best matches and the time taken in ms"""
+        start = time.perf_counter()
+        query = ''.join(text.lower().replace(os.sep, '/').split())
+        if not query:
+            return [], 0.0
+        
+        # A longer query only matches a subset of a complete previous candidate list
+        if self.last_matches is not None and self.last_complete and query.startswith(self.last_text):
+            candidates = [number for number in self.last_matches if self.index.matches(number, query)]
+            complete = True
+        else:
+            candidates, complete = self.index.candidates(query, self.RESULT_LIMIT)
+        self.last_text, self.last_matches, self.last_complete = query, candidates, complete
+        
+        index = self.index
+        results = [(index.paths[number], index.rel_paths[number])
+                   for number in index.search(query, self.RESULT_LIMIT, candidates)]
+        return results, (time.perf_counter() - start) * 1000
+
+
+class ContentSearchThread(QThread):
+    """Searches the contents of the tree's files with a pool of reader threads, streaming the matches
+    
+    Each file is read as bytes in one call, or memory-mapped from MMAP_THRESHOLD on,
+    and searched for the UTF-8 encoded text; only the line of the first match is
+    decoded. Files with a NUL byte near the start are taken as binary and skipped,
+    as are files over the size limit.
+    """
+    matches_found = pyqtSignal(list)
+    progress_updated = pyqtSignal(int)
+    search_finished = pyqtSignal(int, int)
+    
+    MMAP_THRESHOLD = 1024 * 1024
+    BATCH_SIZE = 64
+    
+    def __init__(self, file_source, text: str, match_case: bool, max_file_size: int, workers: Optional[int] = None):
+        super().__init__()
+        # Called on this thread; returns (path, size, mtime_ns) of every file to search
+        self.file_source = file_source
+        self.pattern = re.compile(re.escape(text.encode('utf-8')), 0 if match_case else re.IGNORECASE)
+        self.max_file_size = max_file_size
+        self.workers = workers
+        self.should_cancel = False
+    
+    def run(self):
+        """Main thread execution"""
+        matched = 0
+        searched = 0
+        try:
+            files = [(path, size) for path, size, _ in self.file_source() if size <= self.max_file_size]
+            batches = [files[i:i + self.BATCH_SIZE] for i in range(0, len(files), self.BATCH_SIZE)]
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+            try:
+                futures = [pool.submit(self._search_batch, batch) for batch in batches]
+                progress = -1
+                for done, future in enumerate(as_completed(futures), 1):
+                    if self.should_cancel:
+                        break
+                    hits, batch_searched = future.result()
+                    searched += batch_searched
+                    if hits:
+                        matched += len(hits)
+                        self.matches_found.emit(hits)
+                    if done * 100 // len(futures) != progress:
+                        progress = done * 100 // len(futures)
+                        self.progress_updated.emit(progress)
+            finally:
+                pool.shutdown(wait=True, cancel_futures=True)
+        except Exception as e:
+            logging.error(f"Content search error: {e}", exc_info=True)
+        self.search_finished.emit(matched, searched)
+    
+    def _search_batch(self, batch: List[Tuple[str, int]]) -> Tuple[List[Tuple[str, int, str]], int]:
+        hits = []
+        searched = 0
+        for path, size in batch:
+            if self.should_cancel:
+                break
+            hit = self._search_file(path, size)
+            searched += 1
+            if hit:
+                hits.append(hit)
+        return hits, searched
+    
+    def _search_file(self, path: str, size: int) -> Optional[Tuple[str, int, str]]:
+        """(path, number of matches, line of the first match), None without a match"""
+        try:
+            with open(path, 'rb') as f:
+                if size >= self.MMAP_THRESHOLD:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    data = f.read()
+        except (OSError, ValueError) as e:
+            logging.debug(f"Cannot search {path}: {e}")
+            return None
+        
+        try:
+            if b'\x00' in data[:8192]:
+                return None
+            match = self.pattern.search(data)
+            if match is None:
+                return None
+            count = 1 + sum(1 for _ in self.pattern.finditer(data, match.end()))
+            line_start = data.rfind(b'\n', 0, match.start()) + 1
+            line_end = data.find(b'\n', match.end())
+            if line_end < 0:
+                line_end = len(data)
+            line = bytes(data[line_start:min(line_end, line_start + 200)])
+            return path, count, line.decode('utf-8', errors='replace').strip()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    
+    def cancel(self):
+        """Cancel the search"""
+        self.should_cancel = True
+
+
+class InotifyBackend:
+    """Minimal ctypes binding to Linux inotify, reporting folder and file changes"""
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    STRUCTURE_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    CONTENT_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths_by_wd = {}
+        self.wds_by_path = {}
+    
+    def add_watch(self, path: str) -> bool:
+        """Watch a folder; False if the kernel refused (e.g. watch limit reached)"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            return False
+        self.paths_by_wd[wd] = path
+        self.wds_by_path[path] = wd
+        return True
+    
+    def remove_watch(self, path: str):
+        wd = self.wds_by_path.pop(path, None)
+        if wd is not None:
+            self.paths_by_wd.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+    
+    def read_events(self) -> Tuple[set, set, bool]:
+        """Drain pending events into (changed folders, changed files, overflowed)"""
+        directories, files, overflow = set(), set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self.paths_by_wd.get(wd)
+                if path is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    self.paths_by_wd.pop(wd, None)
+                    self.wds_by_path.pop(path, None)
+                elif mask & self.STRUCTURE_MASK:
+                    directories.add(path)
+                elif mask & self.CONTENT_MASK and name and not mask & self.IN_ISDIR:
+                    files.add(os.path.join(path, name))
+        return directories, files, overflow
+    
+    def watched_paths(self) -> List[str]:
+        return list(self.wds_by_path)
+    
+    def close(self):
+        os.close(self.fd)
+
 
-class TreeLoaderThread(QThread):
-    """Background thread for loading file tree with optimal performance"""
-    progress_updated = pyqtSignal(int)
-    status_updated = pyqtSignal(str)
-    tree_data_chunk = pyqtSignal(list)
-    tree_loaded = pyqtSignal(list)
-    loading_finished = pyqtSignal(bool)
+class DirectoryWatcher(QObject):
+    """Watches loaded folders and reports changes in debounced batches
     
-    def __init__(self, root_directory: str, ignore_list: List[str], include_hidden: bool):
-        super().__init__()
+    On Linux inotify is used directly, which also reports in-place file
+    modifications. Elsewhere QFileSystemWatcher watches the folders. Folders
+    that cannot be watched (e.g. beyond the inotify watch limit) fall back to
+    polling their modification time.
+    """
+    directories_changed = pyqtSignal(list)
+    files_modified = pyqtSignal(list)
+    
+    DEBOUNCE_MS = 300
+    MAX_DELAY_MS = 2000
+    POLL_INTERVAL_MS = 2000
+    
+    def __init__(self, parent=None, stat_cache: Optional[StatCache] = None):
+        super().__init__(parent)
+        self.inotify = None
+        self.watcher = None
+        # Entries of changed folders and modified files are dropped as soon as the event arrives
+        self.stat_cache = stat_cache
+        if sys.platform.startswith('linux'):
+            try:
+                self.inotify = InotifyBackend()
+                self.notifier = QSocketNotifier(self.inotify.fd, QSocketNotifier.Read, self)
+                self.notifier.activated.connect(self._read_inotify)
+            except (OSError, AttributeError) as e:
+                logging.info(f"inotify unavailable, using QFileSystemWatcher: {e}")
+                self.inotify = None
+        if self.inotify is None:
+            self.watcher = QFileSystemWatcher(self)
+            self.watcher.directoryChanged.connect(self._on_directory_changed)
+        
+        self.polled = {}
+        self.changed = set()
+        self.modified = set()
+        self.first_change = None
+        
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.timeout.connect(self._flush)
+        
+        self.poll_timer = QTimer(self)
+        self.poll_timer.timeout.connect(self._poll)
+    
+    def watch(self, paths: List[str]):
+        """Start watching folders"""
+        if not paths:
+            return
+        if self.inotify:
+            failed = [path for path in paths if not self.inotify.add_watch(path)]
+        else:
+            failed = self.watcher.addPaths(paths)
+        for path in failed:
+            try:
+                self.polled[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+        if self.polled and not self.poll_timer.isActive():
+            self.poll_timer.start(self.POLL_INTERVAL_MS)
+    
+    def unwatch(self, paths: List[str]):
+        """Stop watching folders"""
+        if self.inotify:
+            for path in paths:
+                self.inotify.remove_watch(path)
+        else:
+            watched = set(self.watcher.directories())
+            to_remove = [path for path in paths if path in watched]
+            if to_remove:
+                self.watcher.removePaths(to_remove)
+        for path in paths:
+            self.polled.pop(path, None)
+    
+    def clear(self):
+        """Stop watching everything and drop pending changes"""
+        if self.inotify:
+            for path in self.inotify.watched_paths():
+                self.inotify.remove_watch(path)
+        elif self.watcher.directories():
+            self.watcher.removePaths(self.watcher.directories())
+        self.polled.clear()
+        self.poll_timer.stop()
+        self.debounce_timer.stop()
+        self.changed.clear()
+        self.modified.clear()
+        self.first_change = None
+    
+    def _read_inotify(self):
+        directories, files, overflow = self.inotify.read_events()
+        if overflow:
+            # Events were lost; re-check every watched folder
+            directories.update(self.inotify.watched_paths())
+        self.changed.update(directories)
+        self.modified.update(files)
+        if self.stat_cache is not None:
+            for path in directories:
+                self.stat_cache.discard_directory(path)
+            for path in files:
+                self.stat_cache.discard(path)
+        if directories or files:
+            self._schedule_flush()
+    
+    def _on_directory_changed(self, path: str):
+        self.changed.add(path)
+        if self.stat_cache is not None:
+            self.stat_cache.discard_directory(path)
+        self._schedule_flush()
+    
+    def _schedule_flush(self):
+        now = datetime.now()
+        if self.first_change is None:
+            self.first_change = now
+        
+        # Restart the quiet period, but never hold a burst back longer than MAX_DELAY_MS
+        waited_ms = (now - self.first_change).total_seconds() * 1000
+        self.debounce_timer.start(int(max(0, min(self.DEBOUNCE_MS, self.MAX_DELAY_MS - waited_ms))))
+    
+    def _poll(self):
+        for path, mtime_ns in list(self.polled.items()):
+            try:
+                current = os.stat(path).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                self.polled[path] = current
+                self._on_directory_changed(path)
+    
+    def _flush(self):
+        changed = sorted(self.changed)
+        # Files in re-listed folders are refreshed with their folder
+        modified = sorted(path for path in self.modified if os.path.dirname(path) not in self.changed)
+        self.changed.clear()
+        self.modified.clear()
+        self.first_change = None
+        if changed:
+            self.directories_changed.emit(changed)
+        if modified:
+            self.files_modified.emit(modified)
+
+
+class MergePlan:
+    """Immutable snapshot of the tree and its selection for one merge, taken on the GUI thread
+    
+    Entries are in tree order (each folder followed by its contents) with their depth
+    and whether they are the last child, so the worker can write the structure and
+    the file contents without touching widgets or stat'ing anything again.
+    """
+    __slots__ = ('root_directory', 'paths', 'depths', 'last_flags', 'is_dir', 'sizes', 'states',
+                 'selected_count', 'selected_bytes')
+    
+    def __init__(self, root_directory: str, entries: List[Tuple[str, int, bool, bool, int, int]]):
         self.root_directory = root_directory
-        self.ignore_list = ignore_list
-        self.include_hidden = include_hidden
-        self.should_cancel = False
-        
-    def run(self):
-        """Main thread execution"""
-        try:
-            self.load_tree_data()
-        except Exception as e:
-            logging.error(f"Tree loading error: {str(e)}", exc_info=True)
-            self.loading_finished.emit(False)
+        self.paths = tuple(entry[0] for entry in entries)
+        self.depths = array('i', (entry[1] for entry in entries))
+        self.last_flags = bytes(entry[2] for entry in entries)
+        self.is_dir = bytes(entry[3] for entry in entries)
+        self.sizes = array('q', (entry[4] for entry in entries))
+        self.states = bytes(int(entry[5]) for entry in entries)
+        selected = [i for i in range(len(entries)) if not entries[i][3] and entries[i][5] == Qt.Checked]
+        self.selected_count = len(selected)
+        self.selected_bytes = sum(entries[i][4] for i in selected)
     
-    def cancel(self):
-        """Cancel the loading operation"""
-        self.should_cancel = True
+    def __len__(self) -> int:
+        return len(self.paths)
+    
+    def selected_files(self):
+        """(full_path, size) of every checked file in tree order"""
+        for index in range(len(self.paths)):
+            if not self.is_dir[index] and self.states[index] == Qt.Checked:
+                yield self.paths[index], self.sizes[index]
 
-    def load_tree_data(self):
-        """Load all file tree data in a single efficient pass"""
-        self.status_updated.emit("Scanning directory structure...")
-        
-        tree_data = []
-        chunk_size = 100
-        processed_items = 0
-        
-        try:
-            for root, dirs, files in os.walk(self.root_directory, topdown=True):
-                if self.should_cancel:
-                    break
-                
-                # Filter directories in-place to prevent traversal
-                dirs[:] = [d for d in dirs if not self.should_ignore_path(os.path.join(root, d))]
-                
-                # Process directories
-                for dir_name in sorted(dirs, key=str.lower):
-                    if self.should_cancel:
-                        break
-                    
-                    full_path = os.path.join(root, dir_name)
-                    item_data = self._create_item_data(dir_name, full_path, root, is_dir=True)
-                    if item_data:
-                        tree_data.append(item_data)
-                
-                # Process files
-                for file_name in sorted(files, key=str.lower):
-                    if self.should_cancel:
-                        break
-                    
-                    full_path = os.path.join(root, file_name)
-                    if self.should_ignore_path(full_path):
-                        continue
-                    
-                    item_data = self._create_item_data(file_name, full_path, root, is_dir=False)
-                    if item_data:
-                        tree_data.append(item_data)
 
-                processed_items += len(dirs) + len(files)
-                self.status_updated.emit(f"Found {processed_items} items...")
+class MergeWriter:
+    """Binary merge file output
+    
+    Text is encoded as UTF-8 with the platform line endings, as a text mode file would write it.
+    File contents that need no transformation are appended as the bytes they were read as.
+    """
+    
+    def __init__(self, path: str):
+        self.file = open(path, 'wb')
+        self.file.write(codecs.BOM_UTF8)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.file.close()
+    
+    def write(self, text: str):
+        self.file.write(self.encode(text))
+    
+    @staticmethod
+    def encode(text: str) -> bytes:
+        """Bytes written for text"""
+        if os.linesep != '\n':
+            text = text.replace('\n', os.linesep)
+        return text.encode('utf-8')
+    
+    def write_bytes(self, data: bytes):
+        self.file.write(data)
 
-                # Emit chunk if we have enough items
-                if len(tree_data) >= chunk_size:
-                    self.tree_data_chunk.emit(tree_data.copy())
-                    tree_data.clear()
 
-            # Emit any remaining data
-            if tree_data and not self.should_cancel:
-                self.tree_data_chunk.emit(tree_data)
-            
-            if not self.should_cancel:
-                self.tree_loaded.emit([])
-                self.loading_finished.emit(True)
-            
-        except Exception as e:
-            logging.error(f"Error loading tree data: {str(e)}")
-            self.loading_finished.emit(False)
+class PassthroughBlock:
+    """A file block whose content is written without decoding, as the raw bytes it was read as"""
+    __slots__ = ('header', 'data', 'footer')
+    
+    def __init__(self, header: str, data: bytes, footer: str):
+        self.header = header
+        self.data = data
+        self.footer = footer
+
 
-    def _create_item_data(self, name: str, full_path: str, parent_path: str, is_dir: bool) -> Optional[Dict]:
-        """Create item data dictionary for a file or directory"""
+class BlockCache:
+    """Persistent SQLite cache of rendered file blocks, shared by merges in all processes
+    
+    A block is stored as the bytes written to the merge file and is only served while the file
+    still has the size, modification time, inode and change time it had when it was rendered;
+    the change time catches rewrites of the same size within one tick of the modification
+    time, which cannot be set back to it without changing it. Lookups run on the
+    reader threads, each with its own connection; new blocks and hits are written back in
+    batches by the merge thread, and the least recently used blocks are evicted above max_bytes.
+    """
+    
+    # Bump when the rendering of file blocks or the stored columns change; older databases are emptied
+    VERSION = 2
+    FLUSH_ROWS = 500
+    FLUSH_BYTES = 4 * 1024 * 1024
+    
+    def __init__(self, db_path: str, settings_key: str, max_bytes: int):
+        self.db_path = db_path
+        self.settings_key = settings_key
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.stored = 0
+        self.evicted = 0
+        self._pending = []
+        self._pending_bytes = 0
+        self._touched = []
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != self.VERSION:
+                conn.executescript(f"""
+                    DROP TABLE IF EXISTS blocks;
+                    PRAGMA user_version = {self.VERSION};
+                """)
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS blocks (
+                    settings_key TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    ctime_ns INTEGER NOT NULL,
+                    block BLOB NOT NULL,
+                    block_size INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL,
+                    PRIMARY KEY (settings_key, path)
+                );
+                CREATE INDEX IF NOT EXISTS blocks_by_use ON blocks (last_used);
+            """)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+    
+    @staticmethod
+    def stat_key(stat_info: os.stat_result) -> Tuple[int, int, int, int]:
+        """(size, mtime_ns, inode, ctime_ns) a block is stored and looked up with"""
+        return stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino, stat_info.st_ctime_ns
+    
+    def get(self, path: str, stat_key: Tuple[int, int, int, int]) -> Optional[bytes]:
+        """Stored block of a file, if it was rendered from a file with the same stat_key"""
         try:
-            stat_info = os.stat(full_path)
-            return {
-                'name': name,
-                'full_path': full_path,
-                'is_dir': is_dir,
-                'size': 0 if is_dir else stat_info.st_size,
-                'modified': datetime.fromtimestamp(stat_info.st_mtime),
-                'parent_path': parent_path
-            }
-        except (OSError, PermissionError) as e:
-            logging.debug(f"Cannot access {full_path}: {e}")
+            row = self._connect().execute(
+                "SELECT block FROM blocks WHERE settings_key = ? AND path = ? "
+                "AND size = ? AND mtime_ns = ? AND inode = ? AND ctime_ns = ?",
+                (self.settings_key, path) + stat_key
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not read block cache: {e}")
             return None
+        return row[0] if row else None
     
-    def should_ignore_path(self, path: str) -> bool:
-        """Check if a path should be ignored based on patterns"""
-        item = os.path.basename(path)
-        
-        # Hidden files check
-        if not self.include_hidden and item.startswith('.'):
-            return True
-        
-        # Direct matches
-        if item in self.ignore_list:
-            return True
-            
-        # Pattern matches
-        for pattern in self.ignore_list:
-            if pattern.startswith('*') and item.endswith(pattern[1:]):
-                return True
-            elif pattern.endswith('*') and item.startswith(pattern[:-1]):
-                return True
-            elif '*' in pattern:
-                if fnmatch.fnmatch(item, pattern):
-                    return True
-        
-        return False
+    def put(self, path: str, stat_key: Tuple[int, int, int, int], block: bytes):
+        """Queue a freshly rendered block for storage"""
+        self._pending.append((self.settings_key, path) + stat_key + (block, len(block), time.time_ns()))
+        self._pending_bytes += len(block)
+        if len(self._pending) >= self.FLUSH_ROWS or self._pending_bytes >= self.FLUSH_BYTES:
+            self.flush()
+    
+    def touch(self, path: str):
+        """Mark a stored block as used by this merge"""
+        self._touched.append((time.time_ns(), self.settings_key, path))
+        self.hits += 1
+    
+    def flush(self):
+        """Write queued blocks and use times"""
+        pending, touched = self._pending, self._touched
+        self._pending, self._touched, self._pending_bytes = [], [], 0
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO blocks "
+                    "(settings_key, path, size, mtime_ns, inode, ctime_ns, block, block_size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    pending
+                )
+                conn.executemany("UPDATE blocks SET last_used = ? WHERE settings_key = ? AND path = ?", touched)
+            self.stored += len(pending)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not update block cache: {e}")
+    
+    def evict(self):
+        """Drop the least recently used blocks until the cache fits in max_bytes"""
+        try:
+            conn = self._connect()
+            with conn:
+                total = conn.execute("SELECT COALESCE(SUM(block_size), 0) FROM blocks").fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                kept = 0
+                doomed = []
+                for rowid, block_size in conn.execute("SELECT rowid, block_size FROM blocks ORDER BY last_used DESC"):
+                    kept += block_size
+                    if kept > self.max_bytes:
+                        doomed.append((rowid,))
+                conn.executemany("DELETE FROM blocks WHERE rowid = ?", doomed)
+            self.evicted += len(doomed)
+        except sqlite3.Error as e:
+            logging.warning(f"Could not evict from block cache: {e}")
+    
+    def close(self):
+        """Write everything back, evict and close all connections"""
+        self.flush()
+        self.evict()
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+    
+    @classmethod
+    def settings_key(cls, root_directory: str, output_settings: Dict) -> str:
+        """Hash of everything besides the file itself that a rendered block depends on"""
+        key = [cls.VERSION, os.path.abspath(root_directory), output_settings.get('format', 'txt'),
+               output_settings.get('max_file_size', 10_000_000), os.linesep, HAS_CHARDET]
+        return hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
 
 
 class FileProcessor(QThread):
@@ -161,13 +2323,37 @@ class FileProcessor(QThread):
     progress_updated = pyqtSignal(int)
     status_updated = pyqtSignal(str)
     finished_processing = pyqtSignal(str, bool)
+    # Small files are handed to the reader pool in groups to keep the per-task overhead low
+    READ_BATCH_FILES = 16
+    READ_BATCH_BYTES = 1024 * 1024
+    # Byte order marks, longest first: the UTF-32 LE mark starts with the UTF-16 LE one
+    BOMS = ((codecs.BOM_UTF8, 'utf-8-sig'),
+            (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+            (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'))
+    WIDE_BOMS = tuple(bom for bom, encoding in BOMS if encoding != 'utf-8-sig')
+    # Files from this size on are copied to the output in chunks by the writer instead of read whole
+    STREAM_THRESHOLD = 4 * 1024 * 1024
+    STREAM_CHUNK = 1024 * 1024
+    # Status of a file whose content was already written for another file
+    SAME_AS = "🔁 Same as"
+    # Seconds between progress and status signals, so large merges do not flood the GUI
+    PROGRESS_INTERVAL = 0.1
     
-    def __init__(self, tree_widget: QTreeWidget, root_directory: str, output_settings: Dict):
+    def __init__(self, plan: MergePlan, output_settings: Dict):
         super().__init__()
-        self.tree_widget = tree_widget
-        self.root_directory = root_directory
+        self.plan = plan
+        self.root_directory = plan.root_directory
         self.output_settings = output_settings
         self.should_cancel = False
+        self.block_cache = None
+        # Sizes shared by several selected files; only those files can have a duplicate
+        self.shared_sizes = set()
+        # Content digest -> first file written with that content
+        self.first_copies = {}
+        self.total_bytes = 0
+        self.bytes_done = 0
+        self._progress_start = 0.0
+        self._last_progress = 0.0
         
     def run(self):
         """Main thread execution"""
@@ -195,26 +2381,33 @@ class FileProcessor(QThread):
         prefix = "backup_" if self.output_settings.get('backup_mode', False) else ""
         merge_filename = os.path.join(output_folder, f'{prefix}{project_folder_name}_merged_{timestamp}.{output_format}')
         
+        # One pass over the plan for the progress total and possible duplicates; files above
+        # the size limit are not read, so they do not count towards the progress
+        max_size = self.output_settings.get('max_file_size', 10_000_000)
+        size_counts = Counter(size for _, size in self.plan.selected_files() if size <= max_size)
+        self.total_bytes = sum(size * count for size, count in size_counts.items())
+        if self.output_settings.get('deduplicate', False):
+            self.shared_sizes = {size for size, count in size_counts.items() if count > 1}
+        
+        cache_path = self.output_settings.get('block_cache')
+        if cache_path:
+            self.block_cache = BlockCache(cache_path, BlockCache.settings_key(self.root_directory, self.output_settings),
+                                          self.output_settings.get('block_cache_size', 256 * 1024 * 1024))
+        
         try:
-            total_files = self._count_selected_files(self.tree_widget.invisibleRootItem())
             processed_files = 0
             
-            with open(merge_filename, 'w', encoding='utf-8-sig') as merge_file:
+            with MergeWriter(merge_filename) as merge_file:
                 # Write header based on format
                 self._write_header(merge_file, output_format)
                 
                 # Write file tree
                 merge_file.write(self._get_section_header("File Structure", output_format))
-                self._write_tree_summary(self.tree_widget.invisibleRootItem(), merge_file)
+                self._write_tree_summary(merge_file)
                 
                 # Write merged files
                 merge_file.write(self._get_section_header("File Contents", output_format, is_content=True))
-                processed_files = self._write_files(
-                    self.tree_widget.invisibleRootItem(), 
-                    merge_file, 
-                    processed_files, 
-                    total_files
-                )
+                processed_files = self._write_files(merge_file, processed_files)
                 
                 # Write footer if needed
                 if output_format == 'html':
@@ -226,23 +2419,11 @@ class FileProcessor(QThread):
         except Exception as e:
             logging.error(f"Error during file processing: {str(e)}")
             self.finished_processing.emit("", False)
-    
-    def _count_selected_files(self, tree_item: QTreeWidgetItem) -> int:
-        """Count total selected files recursively"""
-        count = 0
-        for index in range(tree_item.childCount()):
-            child = tree_item.child(index)
-            if self.should_cancel:
-                break
-                
-            full_path = child.data(0, Qt.UserRole)
-            check_state = child.checkState(0)
-            
-            if check_state == Qt.Checked and os.path.isfile(full_path):
-                count += 1
-            elif os.path.isdir(full_path) and check_state != Qt.Unchecked:
-                count += self._count_selected_files(child)
-        return count
+        finally:
+            if self.block_cache:
+                self.block_cache.close()
+                logging.info(f"Block cache: {self.block_cache.hits} hits, {self.block_cache.stored} stored, "
+                             f"{self.block_cache.evicted} evicted")
     
     def _write_header(self, file, format_type: str):
         """Write file header based on format"""
@@ -288,108 +2469,383 @@ class FileProcessor(QThread):
         else:
             return f"\n\n{'='*80}\n{title.center(80)}\n{'='*80}\n\n"
     
-    def _write_tree_summary(self, tree_item: QTreeWidgetItem, merge_file, prefix: str = "", is_last: bool = True):
+    def _write_tree_summary(self, merge_file):
         """Write tree structure summary"""
-        for index in range(tree_item.childCount()):
+        plan = self.plan
+        # Whether each open ancestor level was the last child of its folder
+        last_at_depth = []
+        for index in range(len(plan)):
             if self.should_cancel:
                 break
-                
-            child = tree_item.child(index)
-            full_path = child.data(0, Qt.UserRole)
-            is_last_child = index == tree_item.childCount() - 1
-            check_state = child.checkState(0)
+            
+            depth = plan.depths[index]
+            is_last_child = plan.last_flags[index]
+            del last_at_depth[depth:]
+            prefix = "".join("    " if last else "│   " for last in last_at_depth)
+            last_at_depth.append(is_last_child)
             
             connector = "└── " if is_last_child else "├── "
+            check_state = plan.states[index]
             status_icon = "✓" if check_state == Qt.Checked else "◐" if check_state == Qt.PartiallyChecked else "✗"
             
-            merge_file.write(f"{prefix}{connector}{status_icon} {os.path.basename(full_path)}")
+            merge_file.write(f"{prefix}{connector}{status_icon} {os.path.basename(plan.paths[index])}")
             
-            if os.path.isfile(full_path) and check_state == Qt.Checked:
-                try:
-                    size = os.path.getsize(full_path)
-                    merge_file.write(f" ({self._format_file_size(size)})")
-                except:
-                    pass
+            if not plan.is_dir[index] and check_state == Qt.Checked:
+                merge_file.write(f" ({self._format_file_size(plan.sizes[index])})")
             
             merge_file.write("\n")
-            
-            if os.path.isdir(full_path) and check_state != Qt.Unchecked:
-                new_prefix = prefix + ("    " if is_last_child else "│   ")
-                self._write_tree_summary(child, merge_file, new_prefix, is_last_child)
     
-    def _write_files(self, tree_item: QTreeWidgetItem, merge_file, processed_files: int, total_files: int) -> int:
-        """Write file contents recursively"""
-        for index in range(tree_item.childCount()):
+    def _write_files(self, merge_file, processed_files: int) -> int:
+        """Write the contents of all selected files"""
+        max_size = self.output_settings.get('max_file_size', 10_000_000)
+        self._progress_start = time.perf_counter()
+        full_path = ""
+        for full_path, planned_size, file_size, block, stat_key, digest in self._render_blocks():
             if self.should_cancel:
                 break
-                
-            child = tree_item.child(index)
-            full_path = child.data(0, Qt.UserRole)
-            check_state = child.checkState(0)
             
-            if check_state == Qt.Checked and os.path.isfile(full_path):
-                processed_files += 1
-                progress = int((processed_files / total_files) * 100) if total_files > 0 else 0
-                self.progress_updated.emit(progress)
-                self.status_updated.emit(f"Processing: {os.path.basename(full_path)}")
-                
-                self._write_single_file(full_path, merge_file)
-                
-            elif os.path.isdir(full_path) and check_state != Qt.Unchecked:
-                processed_files = self._write_files(child, merge_file, processed_files, total_files)
-        
+            if file_size != planned_size:
+                # The reader found another size than the scan; the total follows the file as read
+                self.total_bytes += (file_size if file_size <= max_size else 0) - \
+                    (planned_size if planned_size <= max_size else 0)
+            processed_files += 1
+            self._report_progress(full_path)
+            bytes_done = self.bytes_done + (file_size if file_size <= max_size else 0)
+            self._write_file(merge_file, full_path, file_size, block, stat_key, digest)
+            # Streamed files count their chunks as they go
+            self.bytes_done = bytes_done
+        
+        if not self.should_cancel:
+            self._report_progress(full_path, force=True)
         return processed_files
     
-    def _write_single_file(self, full_path: str, merge_file):
-        """Write a single file's content"""
-        try:
-            file_size = os.path.getsize(full_path)
-            max_size = self.output_settings.get('max_file_size', 10_000_000)
-            
-            if file_size > max_size:
-                self._write_file_header(full_path, merge_file, f"⚠️ Skipped - File too large ({self._format_file_size(file_size)})")
+    def _report_progress(self, full_path: str, force: bool = False):
+        """Emit byte based progress, throughput and time left, at most every PROGRESS_INTERVAL"""
+        now = time.perf_counter()
+        if not force and now - self._last_progress < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        
+        progress = int(self.bytes_done * 100 / self.total_bytes) if self.total_bytes else 100
+        status = f"Processing: {os.path.basename(full_path)}"
+        elapsed = now - self._progress_start
+        if self.bytes_done and elapsed > 0:
+            rate = self.bytes_done / elapsed
+            remaining = int((self.total_bytes - self.bytes_done) / rate)
+            status += f" – {rate / 1024 / 1024:.1f} MB/s, {remaining // 60}:{remaining % 60:02d} left"
+        self.progress_updated.emit(progress)
+        self.status_updated.emit(status)
+    
+    def _write_file(self, merge_file, full_path: str, file_size: int, block, stat_key: Optional[Tuple],
+                    digest: Optional[bytes]):
+        """Write one file block as produced by _render_blocks"""
+        if block is None and file_size in self.shared_sizes:
+            # Streamed files are hashed before they are copied
+            digest = self._hash_file(full_path)
+        if digest is not None:
+            original = self.first_copies.setdefault(digest, full_path)
+            if original != full_path:
+                merge_file.write(self._file_header(
+                    full_path, f"{self.SAME_AS} {os.path.relpath(original, self.root_directory)}"
+                ))
                 return
-            
-            # Detect encoding
-            encoding = self._detect_encoding(full_path)
-            
-            with open(full_path, 'r', encoding=encoding, errors='replace') as f:
-                content = f.read()
+        
+        if isinstance(block, bytes):
+            # Served from the block cache
+            merge_file.write_bytes(block)
+            self.block_cache.touch(full_path)
+            return
+        if stat_key is not None:
+            data = self._block_bytes(block)
+            if data is not None:
+                merge_file.write_bytes(data)
+                self.block_cache.put(full_path, stat_key, data)
+                return
+        
+        if block is None:
+            self._stream_file(merge_file, full_path, file_size)
+        elif isinstance(block, PassthroughBlock):
+            merge_file.write(block.header)
+            merge_file.write_bytes(block.data)
+            merge_file.write(block.footer)
+        else:
+            merge_file.write(block)
+    
+    def _render_blocks(self):
+        """Yield (full_path, planned size, size as read, rendered block, stat_key, digest) for the selected files in tree order
+        
+        With more than one reader thread, files are read, decoded and rendered by a
+        pool up to `readahead` files ahead of the writer. Futures are kept in a queue in
+        tree order, which serves as the reorder buffer: the writer always waits for the
+        oldest one, so the output order never depends on which read finishes first.
+        Files that are streamed by the writer come with a block of None, blocks to be
+        stored in the block cache with the BlockCache.stat_key they were rendered from and
+        files that may have duplicates with the digest of their content.
+        """
+        workers = self.output_settings.get('read_workers', 1)
+        if workers <= 1:
+            for full_path, file_size in self.plan.selected_files():
+                if self.should_cancel:
+                    return
+                yield (full_path, file_size) + self._render_cached(full_path, file_size)
+            return
+        
+        readahead = max(workers, self.output_settings.get('readahead', 32))
+        # Small enough that every reader has two tasks queued within the read-ahead
+        batch_files = max(1, min(self.READ_BATCH_FILES, readahead // (2 * workers)))
+        pending = deque()
+        pending_files = 0
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for batch in self._read_batches(batch_files):
+                if self.should_cancel:
+                    return
+                pending.append((batch, pool.submit(self._render_batch, batch)))
+                pending_files += len(batch)
+                while pending and pending_files >= readahead:
+                    batch, future = pending.popleft()
+                    pending_files -= len(batch)
+                    yield from self._zip_blocks(batch, future.result())
+            while pending and not self.should_cancel:
+                batch, future = pending.popleft()
+                yield from self._zip_blocks(batch, future.result())
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def _read_batches(self, batch_files: int):
+        """Group consecutive selected files into pool tasks of up to `batch_files` files or READ_BATCH_BYTES"""
+        batch = []
+        batch_bytes = 0
+        for full_path, file_size in self.plan.selected_files():
+            batch.append((full_path, file_size))
+            batch_bytes += file_size
+            if len(batch) >= batch_files or batch_bytes >= self.READ_BATCH_BYTES:
+                yield batch
+                batch = []
+                batch_bytes = 0
+        if batch:
+            yield batch
+    
+    def _render_batch(self, batch: List[Tuple[str, int]]) -> List[Tuple]:
+        return [self._render_cached(full_path, file_size) for full_path, file_size in batch]
+    
+    @staticmethod
+    def _zip_blocks(batch: List[Tuple[str, int]], results: List[Tuple]):
+        for (full_path, file_size), result in zip(batch, results):
+            yield (full_path, file_size) + result
+    
+    def _render_cached(self, full_path: str, file_size: int) -> Tuple:
+        """(size, block, stat_key, digest) of a file, the block served from the block cache when it is still valid
+        
+        The size is that of the opened file, which may differ from the plan's; the cache is looked up
+        with the fstat of the descriptor that is read on a miss, so a hit costs no extra stat call.
+        Cached blocks are bytes. stat_key is only set for a freshly rendered block that may be stored,
+        digest only for files that may have a duplicate; those always bypass the cache. Files streamed
+        by the writer (STREAM_THRESHOLD and more) are neither cached nor hashed from this read.
+        """
+        if file_size in self.shared_sizes:
+            return self._render_hashed(full_path, file_size)
+        if self.block_cache is None:
+            return self._render_checked(full_path, file_size) + (None, None)
+        try:
+            with open(full_path, 'rb') as f:
+                stat_info = os.fstat(f.fileno())
+                stat_key = BlockCache.stat_key(stat_info)
+                cached = self.block_cache.get(full_path, stat_key)
+                if cached is not None:
+                    return stat_info.st_size, cached, None, None
+                file_size, raw = self._read_contents(f, stat_info.st_size)
+            if raw is None:
+                return file_size, self._unread_block(full_path, file_size), None, None
+            block = self._render_raw(full_path, file_size, raw)
+            if file_size != stat_info.st_size:
+                # Grew or shrank while it was read; the block would not match its key
+                stat_key = None
+            return file_size, block, stat_key, None
+        except Exception as e:
+            # Errors are not cached
+            return file_size, self._error_block(full_path, e), None, None
+    
+    def _render_hashed(self, full_path: str, file_size: int) -> Tuple:
+        """(size, block, None, digest) of a file that may have a duplicate, hashed from the same read"""
+        try:
+            with open(full_path, 'rb') as f:
+                file_size, raw = self._read_contents(f)
+            if raw is None:
+                # Streamed files are hashed by the writer
+                return file_size, self._unread_block(full_path, file_size), None, None
+            block = self._render_raw(full_path, file_size, raw)
+            return file_size, block, None, hashlib.blake2b(raw, digest_size=32).digest()
+        except Exception as e:
+            return file_size, self._error_block(full_path, e), None, None
+    
+    def _hash_file(self, full_path: str) -> Optional[bytes]:
+        """Content digest of a file read in STREAM_CHUNK pieces"""
+        digest = hashlib.blake2b(digest_size=32)
+        try:
+            with open(full_path, 'rb') as f:
+                while chunk := f.read(self.STREAM_CHUNK):
+                    if self.should_cancel:
+                        return None
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return digest.digest()
+    
+    def _render_file(self, full_path: str, file_size: int):
+        """Header and content block of a single file; safe to call from reader threads
+        
+        Returns a PassthroughBlock for files whose bytes go to the output unchanged and
+        None for files large enough to be streamed by the writer.
+        """
+        return self._render_checked(full_path, file_size)[1]
+    
+    def _render_checked(self, full_path: str, file_size: int) -> Tuple:
+        """(size as read, block) of a file, read errors rendered as error blocks"""
+        try:
+            return self._render_block(full_path, file_size)
+        except Exception as e:
+            return file_size, self._error_block(full_path, e)
+    
+    def _error_block(self, full_path: str, error: Exception) -> str:
+        logging.error(f"Error processing file {full_path}: {str(error)}")
+        return self._file_header(full_path, f"❌ Error: {str(error)}")
+    
+    def _block_bytes(self, block) -> Optional[bytes]:
+        """A rendered block as written to the merge file; None for files streamed by the writer"""
+        if isinstance(block, str):
+            return MergeWriter.encode(block)
+        if isinstance(block, PassthroughBlock):
+            return MergeWriter.encode(block.header) + block.data + MergeWriter.encode(block.footer)
+        return None
+    
+    def _render_block(self, full_path: str, file_size: int) -> Tuple:
+        """(size as read, block) of a file; raises on read errors"""
+        # The file is read once; the binary check and decoding work on that buffer
+        with open(full_path, 'rb') as f:
+            file_size, raw = self._read_contents(f)
+        if raw is None:
+            return file_size, self._unread_block(full_path, file_size)
+        return file_size, self._render_raw(full_path, file_size, raw)
+    
+    def _read_contents(self, f, file_size: Optional[int] = None) -> Tuple[int, Optional[bytes]]:
+        """Size and contents of an opened file; contents are None when it is too large or to be streamed
+        
+        The plan's sizes are from the scan, so the decision is made from the open file, with the
+        size of a caller's fstat of it when given. At most one byte more than the limit is read,
+        in case the file grows after the fstat.
+        """
+        max_size = self.output_settings.get('max_file_size', 10_000_000)
+        limit = min(max_size, self.STREAM_THRESHOLD - 1)
+        if file_size is None:
+            file_size = os.fstat(f.fileno()).st_size
+        if file_size > limit:
+            return file_size, None
+        raw = f.read(limit + 1)
+        if len(raw) > limit:
+            # Grew after the fstat; the size now, not the bytes read, decides between skipping and streaming
+            return max(os.fstat(f.fileno()).st_size, len(raw)), None
+        return len(raw), raw
+    
+    def _unread_block(self, full_path: str, file_size: int) -> Optional[str]:
+        """Block of a file _read_contents did not read: skipped over the size limit, else None to be streamed"""
+        if file_size > self.output_settings.get('max_file_size', 10_000_000):
+            return self._file_header(full_path, f"⚠️ Skipped - File too large ({self._format_file_size(file_size)})")
+        return None
+    
+    def _render_raw(self, full_path: str, file_size: int, raw: bytes):
+        """Block of a file from its contents"""
+        if b'\x00' in raw and not raw.startswith(self.WIDE_BOMS):
+            return self._file_header(full_path, f"📎 Binary file ({self._format_file_size(file_size)})")
+        
+        if self._is_passthrough(raw):
+            opening, closing = self._content_fences(full_path)
+            # Already read for the checks above, so the buffer is written rather than the file copied again
+            return PassthroughBlock(self._file_header(full_path) + opening, raw, closing)
+        
+        content, encoding = self.decode_bytes(raw)
+        if self._is_binary_content(content):
+            return self._file_header(full_path, f"📎 Binary file ({self._format_file_size(file_size)})")
+        
+        return self._file_header(full_path) + self._file_content(full_path, content)
+    
+    def _stream_file(self, merge_file, full_path: str, file_size: int):
+        """Copy a large file to the output in STREAM_CHUNK pieces
+        
+        Encoding and the binary check are decided from the first chunk, so memory use does not
+        depend on the file size. The copy stops between chunks when processing is cancelled.
+        """
+        try:
+            with open(full_path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                skipped = self._unread_block(full_path, file_size)
+                if skipped is not None:
+                    merge_file.write(skipped)
+                    return
+                chunk = f.read(self.STREAM_CHUNK)
+                if b'\x00' in chunk and not chunk.startswith(self.WIDE_BOMS):
+                    merge_file.write(self._file_header(full_path, f"📎 Binary file ({self._format_file_size(file_size)})"))
+                    return
                 
-                # Check if content is binary
-                if self._is_binary_content(content):
-                    self._write_file_header(full_path, merge_file, f"📎 Binary file ({self._format_file_size(file_size)})")
+                encoding = self._bom_encoding(chunk)
+                if encoding is None:
+                    try:
+                        codecs.getincrementaldecoder('utf-8')().decode(chunk)
+                        encoding = 'utf-8'
+                    except UnicodeDecodeError:
+                        encoding = self._guess_encoding(chunk)
+                decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+                text = decoder.decode(chunk)
+                if self._is_binary_content(text):
+                    merge_file.write(self._file_header(full_path, f"📎 Binary file ({self._format_file_size(file_size)})"))
                     return
                 
-                self._write_file_header(full_path, merge_file)
-                self._write_file_content(full_path, content, merge_file)
+                opening, closing = self._content_fences(full_path)
+                merge_file.write(self._file_header(full_path) + opening)
+                while True:
+                    # A CR at the end of a chunk may be the first half of a CRLF
+                    carry = ''
+                    if chunk and text.endswith('\r'):
+                        text, carry = text[:-1], '\r'
+                    merge_file.write(self._translate_newlines(text))
+                    if not chunk:
+                        break
+                    if self.should_cancel:
+                        return
+                    self.bytes_done += len(chunk)
+                    self._report_progress(full_path)
+                    chunk = f.read(self.STREAM_CHUNK)
+                    text = carry + decoder.decode(chunk, final=not chunk)
+                merge_file.write(closing)
                 
         except Exception as e:
-            self._write_file_header(full_path, merge_file, f"❌ Error: {str(e)}")
             logging.error(f"Error processing file {full_path}: {str(e)}")
+            merge_file.write(self._file_header(full_path, f"❌ Error: {str(e)}"))
     
-    def _write_file_header(self, full_path: str, merge_file, status: str = ""):
-        """Write file header"""
+    def _file_header(self, full_path: str, status: str = "") -> str:
+        """File header block"""
         format_type = self.output_settings.get('format', 'txt')
         filename = os.path.basename(full_path)
         rel_path = os.path.relpath(full_path, self.root_directory)
         
         if format_type == 'md':
-            merge_file.write(f"\n### 📄 {filename}\n\n")
-            merge_file.write(f"**Path:** `{rel_path}`\n")
-            if status:
-                merge_file.write(f"**Status:** {status}\n")
-            merge_file.write("\n")
-        else:
-            merge_file.write(f"\n{'='*80}\n")
-            merge_file.write(f"📄 File: {filename}\n")
-            merge_file.write(f"📁 Path: {rel_path}\n")
+            header = f"\n### 📄 {filename}\n\n**Path:** `{rel_path}`\n"
             if status:
-                merge_file.write(f"⚠️ Status: {status}\n")
-            merge_file.write(f"{'='*80}\n\n")
+                header += f"**Status:** {status}\n"
+            return header + "\n"
+        
+        header = f"\n{'='*80}\n📄 File: {filename}\n📁 Path: {rel_path}\n"
+        if status:
+            header += f"⚠️ Status: {status}\n"
+        return header + f"{'='*80}\n\n"
+    
+    def _file_content(self, full_path: str, content: str) -> str:
+        """File content block with syntax highlighting if applicable"""
+        opening, closing = self._content_fences(full_path)
+        return opening + content + closing
     
-    def _write_file_content(self, full_path: str, content: str, merge_file):
-        """Write file content with syntax highlighting if applicable"""
+    def _content_fences(self, full_path: str) -> Tuple[str, str]:
+        """Text written before and after the content of a file"""
         format_type = self.output_settings.get('format', 'txt')
         ext = os.path.splitext(full_path)[1].lower()
         
@@ -402,31 +2858,66 @@ class FileProcessor(QThread):
                 '.rs': 'rust', '.kt': 'kotlin', '.swift': 'swift'
             }
             lang = lang_map.get(ext, 'text')
-            merge_file.write(f"```{lang}\n{content}\n```\n\n")
+            return f"```{lang}\n", "\n```\n\n"
+        return "", "\n\n"
+    
+    def _is_passthrough(self, raw: bytes) -> bool:
+        """Whether decoding and re-encoding would give back the same bytes: clean UTF-8 text
+        without a byte order mark, already in the line endings the writer produces
+        """
+        if raw.startswith(codecs.BOM_UTF8):
+            return False
+        if os.linesep == '\n':
+            if b'\r' in raw:
+                return False
+        elif not raw.count(b'\r') == raw.count(b'\r\n') == raw.count(b'\n'):
+            return False
+        
+        if raw.isascii():
+            head = raw[:1000].decode('ascii')
         else:
-            merge_file.write(content + "\n\n")
+            try:
+                head = raw.decode('utf-8')[:1000]
+            except UnicodeDecodeError:
+                return False
+        # NUL bytes were ruled out by the caller
+        return not self._is_binary_content(head)
     
-    def _detect_encoding(self, filepath: str) -> str:
-        """Detect file encoding"""
-        # First, try to read as UTF-8
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                f.read()
-                return 'utf-8'
-        except (UnicodeDecodeError, Exception):
-            pass
-
-        if HAS_CHARDET:
+    @classmethod
+    def decode_bytes(cls, raw: bytes) -> Tuple[str, str]:
+        """Decode file contents with universal newlines; returns the text and the encoding used"""
+        encoding = cls._bom_encoding(raw)
+        if encoding is None:
             try:
-                with open(filepath, 'rb') as f:
-                    raw_data = f.read(10000)
-                    result = chardet.detect(raw_data)
-                    if result['confidence'] > 0.7:
-                        return result['encoding']
-            except:
-                pass
+                return cls._translate_newlines(raw.decode('utf-8')), 'utf-8'
+            except UnicodeDecodeError:
+                encoding = cls._guess_encoding(raw)
+        return cls._translate_newlines(raw.decode(encoding, errors='replace')), encoding
+    
+    @classmethod
+    def _bom_encoding(cls, raw: bytes) -> Optional[str]:
+        """Encoding named by a byte order mark at the start of the data"""
+        for bom, encoding in cls.BOMS:
+            if raw.startswith(bom):
+                return encoding
+        return None
+    
+    @staticmethod
+    def _guess_encoding(raw: bytes) -> str:
+        """Encoding of data that is not valid UTF-8, guessed by chardet when it is installed"""
+        if HAS_CHARDET:
+            result = chardet.detect(raw[:10000])
+            if result['confidence'] > 0.7:
+                return result['encoding']
         return 'utf-8'
     
+    @staticmethod
+    def _translate_newlines(text: str) -> str:
+        """Same line endings as a file opened in text mode"""
+        if '\r' in text:
+            return text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
+    
     def _is_binary_content(self, content: str) -> bool:
         """Check if content appears to be binary"""
         if len(content) == 0:
@@ -494,6 +2985,12 @@ class FileRestorer(QThread):
         relevant_content = content[content_start:]
         file_blocks = self._extract_file_blocks(relevant_content)
         
+        # Duplicates were written as a reference to the first copy
+        contents = dict(file_blocks)
+        for file_path, original_path in self._extract_references(relevant_content):
+            if original_path in contents:
+                file_blocks.append((file_path, contents[original_path]))
+        
         if not file_blocks:
             return False, "No files found to restore"
         
@@ -533,13 +3030,14 @@ class FileRestorer(QThread):
             # Find all file headers
             header_pattern = r'^### 📄 ([^\n]+)\n+\*\*Path:\*\* `([^`]+)`(?:\n\*\*Status:\*\* ([^\n]+))?\n+```[\w\d]*\n'  # up to the start of the code block
             headers = list(re.finditer(header_pattern, content, re.MULTILINE))
-            for i, match in enumerate(headers):
+            # Every file header, including those without a code block (duplicates written as a reference)
+            boundaries = [match.start() for match in
+                          re.finditer(r'^### 📄 [^\n]+\n+\*\*Path:\*\* `', content, re.MULTILINE)]
+            for match in headers:
                 file_path = match.group(2).strip()
                 content_start = match.end()
-                if i + 1 < len(headers):
-                    content_end = headers[i + 1].start()
-                else:
-                    content_end = len(content)
+                next_header = bisect_right(boundaries, match.start())
+                content_end = boundaries[next_header] if next_header < len(boundaries) else len(content)
                 file_content = content[content_start:content_end].strip()
                 # Remove markdown code block wrappers if present
                 code_block_pattern = r'^([\s\S]*?)```[\w\d]*\n([\s\S]*?)\n```'
@@ -575,6 +3073,16 @@ class FileRestorer(QThread):
                 if file_path and file_content:
                     file_blocks.append((file_path, file_content))
         return file_blocks
+    
+    def _extract_references(self, content: str) -> List[Tuple[str, str]]:
+        """Extract (file path, path of the identical file) for files merged as a reference"""
+        same_as = re.escape(FileProcessor.SAME_AS)
+        if '### 📄 ' in content:
+            pattern = rf'^\*\*Path:\*\* `([^`]+)`\n\*\*Status:\*\* {same_as} ([^\n]+)$'
+        else:
+            pattern = rf'^📁 Path: ([^\n]+)\n⚠️ Status: {same_as} ([^\n]+)$'
+        return [(match.group(1).strip(), match.group(2).strip())
+                for match in re.finditer(pattern, content, re.MULTILINE)]
 
 
 class RestoreDialog(QDialog):
@@ -689,8 +3197,116 @@ class RestoreDialog(QDialog):
         return self.selected_file, self.output_edit.text()
 
 
+class PathFinderDialog(QDialog):
+    """Fuzzy "go to file" dialog; the chosen files are added to the merge"""
+    
+    def __init__(self, finder_thread: PathFinderThread, parent=None):
+        super().__init__(parent)
+        self.finder_thread = finder_thread
+        self.generation = 0
+        self.selected_paths = []
+        self.query_timer = QTimer(self)
+        self.query_timer.setSingleShot(True)
+        self.query_timer.setInterval(30)
+        self.query_timer.timeout.connect(self.send_query)
+        self.init_ui()
+        self.finder_thread.results_ready.connect(self.show_results)
+    
+    def init_ui(self):
+        """Initialize the dialog UI"""
+        self.setWindowTitle("Go to File")
+        self.setModal(True)
+        self.resize(700, 450)
+        
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(10)
+        
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Type parts of a path, e.g. srcmain...")
+        self.query_edit.textChanged.connect(lambda _: self.query_timer.start())
+        layout.addWidget(self.query_edit)
+        
+        self.result_list = QListWidget()
+        self.result_list.setAlternatingRowColors(True)
+        self.result_list.setSelectionMode(QListWidget.ExtendedSelection)
+        self.result_list.itemDoubleClicked.connect(self.accept_results)
+        layout.addWidget(self.result_list)
+        
+        self.info_label = QLabel("Enter adds the selected files to the merge")
+        layout.addWidget(self.info_label)
+        
+        buttons = QDialogButtonBox(QDialogButtonBox.Cancel, Qt.Horizontal, self)
+        # Default button, so Enter in the query field adds the highlighted result
+        buttons.addButton("Add to Merge", QDialogButtonBox.AcceptRole).setDefault(True)
+        buttons.accepted.connect(self.accept_results)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+    
+    def send_query(self):
+        self.generation += 1
+        self.finder_thread.search(self.generation, self.query_edit.text())
+    
+    def show_results(self, generation: int, answer):
+        """Fill the list with the ranked matches of the latest query"""
+        if generation != self.generation:
+            return
+        results, elapsed_ms = answer
+        self.result_list.clear()
+        for full_path, rel_path in results:
+            item = QListWidgetItem(rel_path)
+            item.setData(Qt.UserRole, full_path)
+            self.result_list.addItem(item)
+        if results:
+            self.result_list.setCurrentRow(0)
+        self.info_label.setText(f"{len(results)} best matches in {elapsed_ms:.1f} ms")
+    
+    def keyPressEvent(self, event):
+        """Up and down move through the results while typing"""
+        if event.key() in (Qt.Key_Up, Qt.Key_Down) and self.result_list.count():
+            step = -1 if event.key() == Qt.Key_Up else 1
+            row = max(0, min(self.result_list.count() - 1, self.result_list.currentRow() + step))
+            self.result_list.setCurrentRow(row)
+            return
+        super().keyPressEvent(event)
+    
+    def accept_results(self):
+        """Accept with the selected results, or the highlighted one"""
+        items = self.result_list.selectedItems() or [self.result_list.currentItem()]
+        self.selected_paths = [item.data(Qt.UserRole) for item in items if item is not None]
+        if self.selected_paths:
+            self.accept()
+    
+    def done(self, result: int):
+        self.finder_thread.results_ready.disconnect(self.show_results)
+        super().done(result)
+
+
+class FileTreeItem(QTreeWidgetItem):
+    """Tree widget item that tracks its check state and, for folders, counts of checked children
+    
+    `pending_state` marks a folder whose children have not been given its new state
+    yet; they are updated when the folder is expanded or before the selection is read.
+    """
+    
+    def __init__(self, check_state: Qt.CheckState):
+        super().__init__()
+        self.check_state = check_state
+        # None until counted; recounted after children are added or removed
+        self.checked_children = None
+        self.partial_children = 0
+        self.pending_state = None
+        # File size in bytes and modification time as last listed, for the merge plan and path finder
+        self.size = 0
+        self.mtime_ns = 0
+        # Entry number in the window's FileIndex
+        self.entry = None
+
+
 class FileMergerApp(QMainWindow):
     """Main application window for File Merger"""
+    # GUI thread time per frame spent inserting tree items while a scan streams in
+    POPULATION_FRAME_BUDGET = 0.016
     
     def __init__(self):
         super().__init__()
@@ -698,14 +3314,71 @@ class FileMergerApp(QMainWindow):
         self.processor_thread = None
         self.tree_loader_thread = None
         self.restorer_thread = None
+        self.content_search_thread = None
         
         # Initialize variables before UI creation
         self.root_directory = None
         self.output_folder = "outputFolder"
         self.ignore_list = self.load_ignore_list()
         self.updating = False
+        # Which files are selected, as include/exclude rules on relative paths
+        self.selection = SelectionTrie()
+        # Path -> tree item for every item of the current tree, kept for the whole session
         self.items_by_path = {}
-        self.pending_items = []
+        # Parent path -> items that arrived before their parent item
+        self.waiting_children = {}
+        self.file_index = None
+        # File metadata shared by the scanners, the merge plan, previews, projects and the watcher
+        self.stat_cache = StatCache()
+        self.stat_cache_root = None
+        self.icon_cache = {}
+        
+        # Scan chunks waiting to be turned into tree items, inserted a frame's worth at a time
+        self.population_queue = deque()
+        self.population_batch = 200
+        self.finalize_pending = False
+        self.name_column_width = 0
+        self.population_timer = QTimer(self)
+        self.population_timer.setInterval(0)
+        self.population_timer.timeout.connect(self.populate_tree_step)
+        
+        # Tree filter: queries answered from a NameIndex on a background thread
+        self.search_thread = NameSearchThread()
+        self.search_thread.results_ready.connect(self.apply_search_results)
+        self.search_thread.start(QThread.LowPriority)
+        self.search_generation = 0
+        # Bumped whenever tree items are added or removed; each search index records the version it saw
+        self.tree_version = 0
+        self.name_index_version = -1
+        self.path_finder_thread = PathFinderThread()
+        self.path_finder_thread.start(QThread.LowPriority)
+        self.path_index_version = -1
+        self.hidden_paths = set()
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.run_search)
+        
+        # Large tree mode: a FileTreeModel shown in tree_view instead of QTreeWidget items
+        self.model_view = False
+        self.tree_model = None
+        
+        # Lazy loading state
+        self.lazy_loading = False
+        self.lazy_scanner = None
+        self.prefetch_thread = None
+        self.prefetched_listings = {}
+        
+        self.watching = False
+        self.directory_watcher = DirectoryWatcher(self, self.stat_cache)
+        self.directory_watcher.directories_changed.connect(self.apply_directory_changes)
+        self.directory_watcher.files_modified.connect(self.apply_file_modifications)
+        # Large tree mode rescans instead of patching; quiet time before a rescan and folders to reopen after it
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(2000)
+        self.rescan_timer.timeout.connect(self.rescan_changed_tree)
+        self.restore_expanded = None
         
         self.setup_logging()
         self.init_ui()
@@ -785,6 +3458,10 @@ class FileMergerApp(QMainWindow):
         restore_action.triggered.connect(self.show_restore_dialog)
         tools_menu.addAction(restore_action)
         
+        path_finder_action = QAction('&Go to File...', self)
+        path_finder_action.triggered.connect(self.show_path_finder)
+        tools_menu.addAction(path_finder_action)
+        
         tools_menu.addSeparator()
         
         settings_action = QAction('&Preferences...', self)
@@ -868,6 +3545,9 @@ class FileMergerApp(QMainWindow):
         self.files_tab = self.create_files_tab()
         self.tab_widget.addTab(self.files_tab, "Files")
         
+        self.search_tab = self.create_search_tab()
+        self.tab_widget.addTab(self.search_tab, "Content Search")
+        
         self.settings_tab = self.create_settings_tab()
         self.tab_widget.addTab(self.settings_tab, "Settings")
         
@@ -911,8 +3591,19 @@ class FileMergerApp(QMainWindow):
         self.tree.setColumnWidth(0, 400)
         self.tree.itemChanged.connect(self.handle_item_changed)
         self.tree.itemDoubleClicked.connect(self.preview_file)
+        self.tree.itemExpanded.connect(self.on_item_expanded)
         layout.addWidget(self.tree)
         
+        self.tree_view = QTreeView()
+        self.tree_view.setFont(QFont("Segoe UI", 10))
+        self.tree_view.setAlternatingRowColors(True)
+        self.tree_view.setRootIsDecorated(True)
+        self.tree_view.setUniformRowHeights(True)
+        self.tree_view.setIconSize(QSize(20, 20))
+        self.tree_view.doubleClicked.connect(self.preview_index)
+        self.tree_view.setVisible(False)
+        layout.addWidget(self.tree_view)
+        
         # Buttons
         button_layout = QHBoxLayout()
         button_layout.setSpacing(15)
@@ -989,6 +3680,64 @@ class FileMergerApp(QMainWindow):
         self.include_hidden_check = QCheckBox("Include hidden files")
         processing_layout.addWidget(self.include_hidden_check, 2, 0, 1, 2)
         
+        processing_layout.addWidget(QLabel("Scanner Threads:"), 3, 0)
+        self.scan_workers_spin = QSpinBox()
+        self.scan_workers_spin.setRange(1, 64)
+        self.scan_workers_spin.setValue(4)
+        self.scan_workers_spin.setToolTip("Directories listed in parallel while scanning. Higher values help on network drives.")
+        processing_layout.addWidget(self.scan_workers_spin, 3, 1)
+        
+        self.scan_index_check = QCheckBox("Remember scan results (only rescan changed folders)")
+        self.scan_index_check.setChecked(True)
+        processing_layout.addWidget(self.scan_index_check, 4, 0, 1, 2)
+        
+        self.lazy_load_check = QCheckBox("Load folders on demand (when expanded)")
+        processing_layout.addWidget(self.lazy_load_check, 5, 0, 1, 2)
+        
+        self.watch_changes_check = QCheckBox("Watch for file changes and update the tree")
+        processing_layout.addWidget(self.watch_changes_check, 6, 0, 1, 2)
+        
+        self.use_git_check = QCheckBox("Use git's file list inside repositories")
+        self.use_git_check.setToolTip("Lists tracked files from git instead of walking the folder. Falls back to the normal scan outside git.")
+        processing_layout.addWidget(self.use_git_check, 7, 0, 1, 2)
+        
+        self.git_untracked_check = QCheckBox("Include untracked files that are not ignored")
+        processing_layout.addWidget(self.git_untracked_check, 8, 0, 1, 2)
+        
+        self.large_tree_check = QCheckBox("Large tree view (for projects with many thousands of files)")
+        self.large_tree_check.setToolTip("Shows the scan results through a lightweight model instead of one widget per file. Folders are always scanned fully.")
+        processing_layout.addWidget(self.large_tree_check, 9, 0, 1, 2)
+        
+        processing_layout.addWidget(QLabel("Reader Threads:"), 10, 0)
+        self.read_workers_spin = QSpinBox()
+        self.read_workers_spin.setRange(1, 64)
+        self.read_workers_spin.setValue(4)
+        self.read_workers_spin.setToolTip("Files read and decoded in parallel while merging. 1 reads them one after another.")
+        processing_layout.addWidget(self.read_workers_spin, 10, 1)
+        
+        processing_layout.addWidget(QLabel("Read-ahead (files):"), 11, 0)
+        self.readahead_spin = QSpinBox()
+        self.readahead_spin.setRange(1, 1024)
+        self.readahead_spin.setValue(32)
+        self.readahead_spin.setToolTip("How many files may be read ahead of the one being written. Bounds the memory used.")
+        processing_layout.addWidget(self.readahead_spin, 11, 1)
+        
+        self.block_cache_check = QCheckBox("Cache merged files (re-merges only read changed files)")
+        self.block_cache_check.setChecked(True)
+        processing_layout.addWidget(self.block_cache_check, 12, 0, 1, 2)
+        
+        processing_layout.addWidget(QLabel("Merge Cache Size:"), 13, 0)
+        self.block_cache_spin = QSpinBox()
+        self.block_cache_spin.setRange(16, 16384)
+        self.block_cache_spin.setValue(256)
+        self.block_cache_spin.setSuffix(" MB")
+        self.block_cache_spin.setToolTip("Least recently used files are dropped from the cache above this size.")
+        processing_layout.addWidget(self.block_cache_spin, 13, 1)
+        
+        self.dedup_check = QCheckBox("Write identical files only once (later copies refer to the first)")
+        self.dedup_check.setToolTip("Restoring the merge file recreates every copy.")
+        processing_layout.addWidget(self.dedup_check, 14, 0, 1, 2)
+        
         layout.addWidget(processing_group)
         
         ignore_group = QGroupBox("Ignore Patterns")
@@ -999,15 +3748,66 @@ class FileMergerApp(QMainWindow):
         self.ignore_text.setPlainText("\n".join(self.ignore_list))
         ignore_layout.addWidget(self.ignore_text)
         
-        ignore_help = QLabel("Enter patterns to ignore (one per line). Supports wildcards like *.pyc, __pycache__, etc.")
+        ignore_help = QLabel("Enter patterns to ignore (one per line). Uses .gitignore syntax: *.pyc, __pycache__, build/, /dist, docs/**/*.tmp, !keep.log")
         ignore_help.setStyleSheet("color: #808080; font-size: 11px;")
         ignore_layout.addWidget(ignore_help)
         
+        self.gitignore_check = QCheckBox("Also respect .gitignore files in the project")
+        self.gitignore_check.setChecked(False)
+        ignore_layout.addWidget(self.gitignore_check)
+        
         layout.addWidget(ignore_group)
         
         layout.addStretch()
         return widget
 
+    def create_search_tab(self):
+        """Create content search tab content"""
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+        layout.setContentsMargins(24, 24, 24, 24)
+        layout.setSpacing(15)
+        
+        search_controls = QHBoxLayout()
+        self.content_search_edit = QLineEdit()
+        self.content_search_edit.setPlaceholderText("Text to find in file contents...")
+        self.content_search_edit.returnPressed.connect(self.toggle_content_search)
+        search_controls.addWidget(self.content_search_edit, 1)
+        
+        self.content_match_case_check = QCheckBox("Match case")
+        search_controls.addWidget(self.content_match_case_check)
+        
+        self.content_search_button = QPushButton("Search")
+        self.content_search_button.setCursor(Qt.PointingHandCursor)
+        self.content_search_button.clicked.connect(self.toggle_content_search)
+        search_controls.addWidget(self.content_search_button)
+        layout.addLayout(search_controls)
+        
+        self.content_results = QTreeWidget()
+        self.content_results.setHeaderLabels(['File', 'Matches', 'First Match'])
+        self.content_results.setFont(QFont("Segoe UI", 10))
+        self.content_results.setAlternatingRowColors(True)
+        self.content_results.setRootIsDecorated(False)
+        self.content_results.setUniformRowHeights(True)
+        self.content_results.setColumnWidth(0, 350)
+        self.content_results.setColumnWidth(1, 80)
+        self.content_results.itemDoubleClicked.connect(
+            lambda item, column: self.preview_path(item.data(0, Qt.UserRole)))
+        layout.addWidget(self.content_results)
+        
+        result_controls = QHBoxLayout()
+        self.content_status_label = QLabel("Searches the files in the tree; binary and oversized files are skipped")
+        result_controls.addWidget(self.content_status_label, 1)
+        
+        self.select_matches_button = QPushButton("Select All Matches")
+        self.select_matches_button.setCursor(Qt.PointingHandCursor)
+        self.select_matches_button.setEnabled(False)
+        self.select_matches_button.clicked.connect(self.select_content_matches)
+        result_controls.addWidget(self.select_matches_button)
+        layout.addLayout(result_controls)
+        
+        return widget
+
     def create_preview_tab(self):
         """Create preview tab content"""
         widget = QWidget()
@@ -1029,13 +3829,25 @@ class FileMergerApp(QMainWindow):
             ("Ctrl+D", self.select_no_files),
             ("F5", self.refresh_tree),
             ("Ctrl+F", lambda: self.search_box.setFocus()),
+            ("Ctrl+P", self.show_path_finder),
         ]
         
         for key_sequence, callback in shortcuts:
             QShortcut(QKeySequence(key_sequence), self, callback)
 
+    def data_file_path(self, name: str) -> str:
+        """Path of a cache file in the user's application data folder, which is created if needed"""
+        folder = QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+        if not folder:
+            folder = os.path.dirname(os.path.abspath(__file__))
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, name)
+
     def get_icon(self, icon_name: str) -> QIcon:
         """Get system icons"""
+        icon = self.icon_cache.get(icon_name)
+        if icon is not None:
+            return icon
         style = QApplication.style()
         icon_map = {
             'folder-open': style.SP_DirOpenIcon,
@@ -1045,7 +3857,9 @@ class FileMergerApp(QMainWindow):
             'settings': style.SP_ComputerIcon,
             'preview': style.SP_FileDialogDetailedView
         }
-        return style.standardIcon(icon_map.get(icon_name, style.SP_FileIcon))
+        icon = style.standardIcon(icon_map.get(icon_name, style.SP_FileIcon))
+        self.icon_cache[icon_name] = icon
+        return icon
 
     def apply_stylesheet(self):
         """Apply modern stylesheet to application"""
@@ -1094,7 +3908,7 @@ class FileMergerApp(QMainWindow):
             }
             
             /* Tree Widget */
-            QTreeWidget {
+            QTreeView {
                 border: 1px solid #3c3f41;
                 border-radius: 6px;
                 background-color: #2b2b2b;
@@ -1102,15 +3916,15 @@ class FileMergerApp(QMainWindow):
                 color: #e0e0e0;
                 padding: 5px;
             }
-            QTreeWidget::item {
+            QTreeView::item {
                 padding: 6px;
                 border-radius: 4px;
             }
-            QTreeWidget::item:selected {
+            QTreeView::item:selected {
                 background-color: #365880;
                 color: white;
             }
-            QTreeWidget::item:hover {
+            QTreeView::item:hover {
                 background-color: #3c3f41;
             }
             QHeaderView::section {
@@ -1357,6 +4171,7 @@ class FileMergerApp(QMainWindow):
         )
         if folder_selected:
             self.root_directory = folder_selected
+            self.selection = SelectionTrie()
             self.settings.setValue('last_directory', folder_selected)
             self.path_label.setText(f"📁 {folder_selected}")
             self.statusBar.showMessage(f"Loading directory: {folder_selected}")
@@ -1364,15 +4179,35 @@ class FileMergerApp(QMainWindow):
             # Start threaded loading
             self.start_tree_loading()
 
-    def start_tree_loading(self):
-        """Start threaded tree loading"""
+    def start_tree_loading(self, refresh: bool = False):
+        """Start threaded tree loading; refresh re-reads every folder instead of trusting the scan index"""
         if self.tree_loader_thread and self.tree_loader_thread.isRunning():
             self.tree_loader_thread.cancel()
             self.tree_loader_thread.wait(1000)
         
+        self.stop_prefetching()
+        self.directory_watcher.clear()
+        self.rescan_timer.stop()
         self.tree.clear()
+        self.tree_view.setModel(None)
+        self.tree_model = None
         self.items_by_path = {}
-        self.pending_items = []
+        self.waiting_children = {}
+        self.population_queue.clear()
+        self.population_timer.stop()
+        self.finalize_pending = False
+        self.name_column_width = 0
+        self.tree.setColumnWidth(0, 400)
+        self.set_fixed_column_widths()
+        self.prefetched_listings = {}
+        self.file_index = FileIndex(self.root_directory)
+        # Results for the previous tree are dropped when they arrive
+        self.search_generation += 1
+        self.hidden_paths = set()
+        # Kept across reloads of the same folder; the scan replaces the entries of every folder it lists
+        if self.stat_cache_root != self.root_directory:
+            self.stat_cache.clear()
+            self.stat_cache_root = self.root_directory
         
         # Set progress bar to busy mode
         self.progress_bar.setVisible(True)
@@ -1384,120 +4219,625 @@ class FileMergerApp(QMainWindow):
         current_ignores = self.ignore_text.toPlainText().strip().split('\n')
         current_ignores = [p.strip() for p in current_ignores if p.strip()]
         include_hidden = self.include_hidden_check.isChecked()
-        
-        self.tree_loader_thread = TreeLoaderThread(self.root_directory, current_ignores, include_hidden)
+        scan_workers = self.scan_workers_spin.value()
+        index_path = None
+        if self.scan_index_check.isChecked():
+            index_path = self.data_file_path('scan_index.db')
+        
+        self.model_view = self.large_tree_check.isChecked()
+        self.tree.setVisible(not self.model_view)
+        self.tree_view.setVisible(self.model_view)
+        # The model is built from a complete scan
+        self.lazy_loading = self.lazy_load_check.isChecked() and not self.model_view
+        self.watching = self.watch_changes_check.isChecked()
+        self.lazy_scanner = self.create_scanner()
+        if self.lazy_loading:
+            self.prefetch_thread = DirectoryPrefetchThread(self.create_scanner())
+            self.prefetch_thread.listing_ready.connect(self.on_listing_prefetched)
+            self.prefetch_thread.start(QThread.LowPriority)
+        
+        self.tree_loader_thread = TreeLoaderThread(
+            self.root_directory, current_ignores, include_hidden, scan_workers, index_path, self.lazy_loading,
+            self.use_git_check.isChecked(), self.git_untracked_check.isChecked(), self.gitignore_check.isChecked(),
+            self.stat_cache, refresh
+        )
         self.tree_loader_thread.status_updated.connect(self.statusBar.showMessage)
         self.tree_loader_thread.tree_data_chunk.connect(self.update_tree_data)
         self.tree_loader_thread.tree_loaded.connect(self.finalize_tree_building)
         self.tree_loader_thread.loading_finished.connect(self.on_tree_loading_finished)
         self.tree_loader_thread.start()
 
-    def update_tree_data(self, tree_data_chunk: List[Dict]):
-        """Update tree widget with new data chunk"""
+    def update_tree_data(self, chunk: ScanChunk):
+        """Queue a scan chunk for insertion into the tree"""
+        self.file_index.extend(chunk)
+        if self.model_view:
+            # The model is created once the scan is complete
+            return
+        
+        self.population_queue.append([chunk, 0])
+        if not self.population_timer.isActive():
+            self.population_timer.start()
+
+    def populate_tree_step(self):
+        """Insert one batch of queued items, sized to fit the frame budget"""
+        if self.tree_loader_thread and self.tree_loader_thread.should_cancel:
+            self.population_queue.clear()
+            self.population_timer.stop()
+            return
+        
+        start = time.perf_counter()
+        self.tree.setUpdatesEnabled(False)
         try:
-            # Sort chunk: directories first, then by name
-            tree_data_chunk.sort(key=lambda x: (not x['is_dir'], x['name'].lower()))
-            
-            for item_data in tree_data_chunk:
-                if self.tree_loader_thread.should_cancel:
-                    break
-                
-                # Create tree item
-                tree_item = QTreeWidgetItem()
-                tree_item.setText(0, item_data['name'])
-                tree_item.setCheckState(0, Qt.Checked)
-                tree_item.setData(0, Qt.UserRole, item_data['full_path'])
-                
-                if item_data['is_dir']:
-                    tree_item.setIcon(0, self.get_icon('folder'))
-                    tree_item.setText(1, "")
-                else:
-                    tree_item.setIcon(0, self.get_icon('file'))
-                    tree_item.setText(1, self.format_file_size(item_data['size']))
+            inserted = self.insert_queued_items(self.population_batch)
+        except Exception as e:
+            logging.error(f"Error updating tree data: {e}")
+            self.population_queue.clear()
+            inserted = 0
+        finally:
+            self.tree.setUpdatesEnabled(True)
+        elapsed = time.perf_counter() - start
+        
+        # Steer the batch size towards the frame budget
+        if inserted >= self.population_batch and elapsed > 0:
+            target = int(self.population_batch * self.POPULATION_FRAME_BUDGET / elapsed)
+            self.population_batch = max(50, min(20000, (self.population_batch + target) // 2))
+        self.update_name_column_width()
+        
+        if not self.population_queue:
+            self.population_timer.stop()
+            if self.finalize_pending:
+                self.finalize_pending = False
+                self.finalize_tree_building([])
+
+    def flush_tree_population(self):
+        """Insert everything still queued right away"""
+        if not self.population_queue:
+            return
+        self.tree.setUpdatesEnabled(False)
+        try:
+            while self.population_queue:
+                self.insert_queued_items(20000)
+        finally:
+            self.tree.setUpdatesEnabled(True)
+        self.update_name_column_width()
+        self.population_timer.stop()
+        if self.finalize_pending:
+            self.finalize_pending = False
+            self.finalize_tree_building([])
+
+    def insert_queued_items(self, limit: int) -> int:
+        """Create up to `limit` queued items, adding each folder's children with one addChildren call"""
+        file_index = self.file_index
+        root_depth = self.root_directory.count(os.sep)
+        indentation = self.tree.indentation()
+        char_width = self.tree.fontMetrics().averageCharWidth()
+        group_parent = None
+        group = []
+        inserted = 0
+        
+        while inserted < limit and self.population_queue:
+            pending = self.population_queue[0]
+            chunk, offset = pending
+            end = min(len(chunk), offset + limit - inserted)
+            for position in range(offset, end):
+                index = chunk.start + position
+                parent_path = file_index.parent_path(index)
+                full_path = file_index.path(index)
+                name = chunk.names[position]
+                tree_item = self.new_tree_item(name, full_path, bool(chunk.is_dir[position]),
+                                               chunk.sizes[position], chunk.mtimes[position], Qt.Checked, index)
                 
-                tree_item.setText(2, item_data['modified'].strftime("%Y-%m-%d %H:%M"))
+                if parent_path != group_parent:
+                    self.attach_items(group_parent, group)
+                    group_parent, group = parent_path, []
+                group.append(tree_item)
                 
-                # Find parent and add item
-                parent_path = item_data['parent_path']
-                if parent_path == self.root_directory:
-                    self.tree.addTopLevelItem(tree_item)
-                else:
-                    parent_item = self.items_by_path.get(parent_path)
-                    if parent_item:
-                        parent_item.addChild(tree_item)
-                    else:
-                        self.pending_items.append((tree_item, parent_path))
+                # Attach children that arrived before this folder
+                waiting = self.waiting_children.pop(full_path, None)
+                if waiting:
+                    tree_item.addChildren(waiting)
+                    tree_item.checked_children = None
                 
-                # Store item for future reference
-                self.items_by_path[item_data['full_path']] = tree_item
-            
-            # Process pending items
-            self.process_pending_items()
+                depth = full_path.count(os.sep) - root_depth
+                self.name_column_width = max(self.name_column_width,
+                                             depth * indentation + len(name) * char_width)
             
-            # Update columns periodically
-            if len(self.items_by_path) % 100 == 0:
-                for i in range(3):
-                    self.tree.resizeColumnToContents(i)
-            
-        except Exception as e:
-            logging.error(f"Error updating tree data: {e}")
+            inserted += end - offset
+            if end >= len(chunk):
+                self.population_queue.popleft()
+            else:
+                pending[1] = end
+        
+        self.attach_items(group_parent, group)
+        return inserted
+
+    def attach_items(self, parent_path: Optional[str], items: List[QTreeWidgetItem]):
+        """Add items below the folder with the given path, or park them until it exists"""
+        if not items:
+            return
+        if parent_path == self.root_directory:
+            self.tree.addTopLevelItems(items)
+            return
+        parent_item = self.items_by_path.get(parent_path)
+        if parent_item:
+            parent_item.addChildren(items)
+            parent_item.checked_children = None
+        else:
+            self.waiting_children.setdefault(parent_path, []).extend(items)
+
+    def update_name_column_width(self):
+        """Widen the name column from the longest name seen instead of measuring every row"""
+        # Checkbox, icon and padding next to the text
+        width = min(self.name_column_width + 90, 900)
+        if width > self.tree.columnWidth(0):
+            self.tree.setColumnWidth(0, width)
 
-    def process_pending_items(self):
-        """Process items that were waiting for their parents"""
-        remaining_pending = []
+    def set_fixed_column_widths(self):
+        """Size and date columns have a known maximum text width"""
+        metrics = self.tree.fontMetrics()
+        self.tree.setColumnWidth(1, metrics.horizontalAdvance("1023.9MB") + 40)
+        self.tree.setColumnWidth(2, metrics.horizontalAdvance("2000-00-00 00:00") + 40)
+
+    def create_scanner(self) -> DirectoryScanner:
+        """Directory scanner configured with the current ignore settings"""
+        current_ignores = [p.strip() for p in self.ignore_text.toPlainText().strip().split('\n') if p.strip()]
+        return DirectoryScanner(
+            current_ignores, self.include_hidden_check.isChecked(),
+            use_gitignore=self.gitignore_check.isChecked(), root_directory=self.root_directory,
+            stat_cache=self.stat_cache
+        )
+
+    def create_tree_item(self, item_data: Dict, check_state: Qt.CheckState, parent_entry: int) -> QTreeWidgetItem:
+        """Create a tree item from an item data dictionary and add it to the file index"""
+        entry = self.file_index.append(parent_entry, item_data['name'], item_data['is_dir'],
+                                       item_data['size'], item_data['mtime_ns'])
+        return self.new_tree_item(item_data['name'], item_data['full_path'], item_data['is_dir'],
+                                  item_data['size'], item_data['mtime_ns'], check_state, entry)
+
+    def new_tree_item(self, name: str, full_path: str, is_dir: bool, size: int, mtime_ns: int,
+                      check_state: Qt.CheckState, entry: int) -> QTreeWidgetItem:
+        """Create a tree item for a scanned file or directory"""
+        tree_item = FileTreeItem(check_state)
+        tree_item.size = 0 if is_dir else size
+        tree_item.mtime_ns = mtime_ns
+        tree_item.entry = entry
+        self.items_by_path[full_path] = tree_item
+        self.tree_version += 1
+        tree_item.setText(0, name)
+        tree_item.setCheckState(0, check_state)
+        tree_item.setData(0, Qt.UserRole, full_path)
+        tree_item.setData(0, IS_DIR_ROLE, is_dir)
+        
+        if is_dir:
+            tree_item.setIcon(0, self.get_icon('folder'))
+            tree_item.setText(1, "")
+            if self.lazy_loading:
+                # Show the expand arrow until the folder is actually listed
+                tree_item.setData(0, LAZY_ROLE, True)
+                tree_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        else:
+            tree_item.setIcon(0, self.get_icon('file'))
+            tree_item.setText(1, self.format_file_size(size))
         
-        for tree_item, parent_path in self.pending_items:
-            parent_item = self.items_by_path.get(parent_path)
-            if parent_item:
-                parent_item.addChild(tree_item)
-            else:
-                remaining_pending.append((tree_item, parent_path))
+        tree_item.setText(2, self.format_mtime(mtime_ns))
+        return tree_item
+
+    def on_item_expanded(self, item: QTreeWidgetItem):
+        """List a lazily loaded folder the first time it is expanded"""
+        if item.data(0, LAZY_ROLE):
+            self.load_lazy_item(item)
+        if item.pending_state is not None:
+            was_updating = self.updating
+            self.updating = True
+            self.apply_pending_state(item)
+            self.updating = was_updating
+
+    def load_lazy_item(self, item: QTreeWidgetItem):
+        """Populate an unloaded folder from the prefetch cache or from disk"""
+        full_path = item.data(0, Qt.UserRole)
+        items = self.prefetched_listings.pop(full_path, None)
+        if items is None:
+            items = self.lazy_scanner.list_item_data(full_path)
+        
+        was_updating = self.updating
+        self.updating = True
+        children = [self.create_tree_item(item_data, self.selection_state(item_data['full_path'], item_data['is_dir']),
+                                          item.entry)
+                    for item_data in items]
+        item.setData(0, LAZY_ROLE, False)
+        item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+        item.addChildren(children)
+        item.checked_children = None
+        self.updating = was_updating
+        
+        if self.watching:
+            self.directory_watcher.watch([full_path])
+        
+        # Prefetch the next level in the background
+        if self.prefetch_thread:
+            self.prefetch_thread.prefetch([item_data['full_path'] for item_data in items if item_data['is_dir']])
+
+    def get_loaded_directories(self) -> List[str]:
+        """Paths of all folders in the tree whose contents are listed"""
+        directories = []
+        stack = [self.tree.invisibleRootItem()]
+        while stack:
+            item = stack.pop()
+            for i in range(item.childCount()):
+                child = item.child(i)
+                if child.data(0, IS_DIR_ROLE) and not child.data(0, LAZY_ROLE):
+                    directories.append(child.data(0, Qt.UserRole))
+                    stack.append(child)
+        return directories
+
+    def find_item_by_path(self, full_path: str) -> Optional[QTreeWidgetItem]:
+        """Find the tree item for a path below the root directory"""
+        if os.path.relpath(full_path, self.root_directory) == '.':
+            return self.tree.invisibleRootItem()
+        return self.items_by_path.get(full_path)
+
+    def apply_directory_changes(self, paths: List[str]):
+        """Patch the tree for folders reported by the watcher, keeping check and expansion state"""
+        if not self.root_directory or (self.tree_loader_thread and self.tree_loader_thread.isRunning()):
+            return
+        
+        if self.model_view:
+            # The model is rebuilt from a rescan (served from the scan index where unchanged) once events settle
+            self.rescan_timer.start()
+            return
+        
+        patched = 0
+        self.tree.setUpdatesEnabled(False)
+        try:
+            for path in paths:
+                self.prefetched_listings.pop(path, None)
+                item = self.find_item_by_path(path)
+                metadata = self.stat_cache.lookup(path)
+                if item is None or item.data(0, LAZY_ROLE) or metadata is None or not metadata[0]:
+                    # Unknown, not loaded yet or deleted - the parent folder's event handles it
+                    continue
+                self.patch_directory_item(item, path)
+                patched += 1
+        finally:
+            self.tree.setUpdatesEnabled(True)
+        
+        if patched:
+            self.statusBar.showMessage(
+                f"Updated {patched} folder(s) from file changes, {self.file_index.file_count()} files", 3000)
+
+    def rescan_changed_tree(self):
+        """Rescan the large tree view after watcher events, keeping its open folders"""
+        if not self.model_view or self.tree_model is None:
+            return
+        if self.tree_loader_thread and self.tree_loader_thread.isRunning():
+            self.rescan_timer.start()
+            return
+        proxy = self.tree_view.model()
+        self.restore_expanded = (
+            [path for entry, path in self.file_index.dir_paths.items()
+             if entry >= 0 and self.tree_view.isExpanded(proxy.mapFromSource(self.tree_model.entry_index(entry)))],
+            self.tree_view.verticalScrollBar().value())
+        self.start_tree_loading()
+
+    def apply_file_modifications(self, paths: List[str]):
+        """Refresh size and date of files modified in place"""
+        if not self.root_directory or (self.tree_loader_thread and self.tree_loader_thread.isRunning()):
+            return
+        
+        if self.model_view:
+            for path in paths:
+                entry = self.file_index.find(path) if self.tree_model else None
+                if entry is None or entry < 0 or self.file_index.is_dir[entry]:
+                    continue
+                metadata = self.stat_cache.lookup(path)
+                if metadata is None:
+                    continue
+                self.tree_model.refresh_entry(entry, metadata[1], metadata[2])
+            return
         
-        self.pending_items = remaining_pending
+        self.tree.setUpdatesEnabled(False)
+        try:
+            for path in paths:
+                item = self.find_item_by_path(path)
+                if item is None or item.data(0, IS_DIR_ROLE):
+                    continue
+                metadata = self.stat_cache.lookup(path)
+                if metadata is None:
+                    continue
+                item.size = metadata[1]
+                item.mtime_ns = metadata[2]
+                self.file_index.update(item.entry, metadata[1], metadata[2])
+                item.setText(1, self.format_file_size(metadata[1]))
+                item.setText(2, self.format_mtime(metadata[2]))
+        finally:
+            self.tree.setUpdatesEnabled(True)
+
+    def patch_directory_item(self, item: QTreeWidgetItem, path: str):
+        """Add, remove and update the children of one folder item to match the disk"""
+        listing = self.lazy_scanner.list_item_data(path)
+        listed = {item_data['full_path']: item_data for item_data in listing}
+        existing = {item.child(i).data(0, Qt.UserRole): item.child(i) for i in range(item.childCount())}
+        
+        is_root = item is self.tree.invisibleRootItem()
+        parent_entry = -1 if is_root else item.entry
+        
+        was_updating = self.updating
+        self.updating = True
+        try:
+            # Removed entries
+            for full_path, child in existing.items():
+                if full_path not in listed:
+                    self.directory_watcher.unwatch([full_path] + self.get_subtree_directories(child))
+                    self.forget_subtree(child)
+                    item.removeChild(child)
+            
+            # Modified files
+            for full_path, child in existing.items():
+                item_data = listed.get(full_path)
+                if item_data and not item_data['is_dir']:
+                    child.size = item_data['size']
+                    child.mtime_ns = item_data['mtime_ns']
+                    self.file_index.update(child.entry, item_data['size'], item_data['mtime_ns'])
+                    child.setText(1, self.format_file_size(item_data['size']))
+                    child.setText(2, self.format_mtime(item_data['mtime_ns']))
+            
+            # New entries, inserted at their sorted position (folders first)
+            sort_keys = [(not sibling.data(0, IS_DIR_ROLE), sibling.text(0).lower())
+                         for sibling in (item.child(i) for i in range(item.childCount()))]
+            for item_data in listing:
+                if item_data['full_path'] in existing:
+                    continue
+                check_state = self.selection_state(item_data['full_path'], item_data['is_dir'])
+                new_item = self.create_tree_item(item_data, check_state, parent_entry)
+                sort_key = (not item_data['is_dir'], item_data['name'].lower())
+                position = bisect_right(sort_keys, sort_key)
+                sort_keys.insert(position, sort_key)
+                item.insertChild(position, new_item)
+                
+                if item_data['is_dir'] and not self.lazy_loading:
+                    self.build_subtree(new_item, item_data['full_path'])
+                    if check_state == Qt.PartiallyChecked:
+                        self.apply_selection_to_item(new_item)
+            
+            if not is_root and item.childCount():
+                self.update_parent_state(item)
+        finally:
+            self.updating = was_updating
+
+    def build_subtree(self, parent_item: QTreeWidgetItem, path: str):
+        """Scan a newly created folder and add its whole subtree"""
+        items_by_path = {path: parent_item}
+        for root, dirs, files in self.lazy_scanner.walk(path):
+            root_item = items_by_path.get(root)
+            if root_item is None:
+                continue
+            children = []
+            for entry in dirs + files:
+                item_data = self.lazy_scanner.create_item_data(entry, root)
+                if item_data:
+                    child = self.create_tree_item(
+                        item_data, self.selection_state(item_data['full_path'], item_data['is_dir']),
+                        root_item.entry)
+                    children.append(child)
+                    if item_data['is_dir']:
+                        items_by_path[item_data['full_path']] = child
+            root_item.addChildren(children)
+            root_item.checked_children = None
+        self.directory_watcher.watch(list(items_by_path))
+
+    def forget_subtree(self, item: QTreeWidgetItem):
+        """Drop an item and everything below it from the path index"""
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            full_path = current.data(0, Qt.UserRole)
+            self.items_by_path.pop(full_path, None)
+            self.stat_cache.discard(full_path)
+            self.file_index.remove(current.entry)
+            self.tree_version += 1
+            stack.extend(current.child(i) for i in range(current.childCount()))
+
+    def get_subtree_directories(self, item: QTreeWidgetItem) -> List[str]:
+        """Paths of all folders below a tree item"""
+        directories = []
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            for i in range(current.childCount()):
+                child = current.child(i)
+                if child.data(0, IS_DIR_ROLE):
+                    directories.append(child.data(0, Qt.UserRole))
+                    stack.append(child)
+        return directories
+
+    def on_listing_prefetched(self, path: str, items: List[Dict]):
+        """Keep a prefetched folder listing until the folder is expanded"""
+        self.prefetched_listings[path] = items
+
+    def stop_prefetching(self):
+        """Stop the background prefetcher"""
+        if self.prefetch_thread:
+            self.prefetch_thread.cancel()
+            self.prefetch_thread.wait(1000)
+            self.prefetch_thread = None
 
     def finalize_tree_building(self, all_data: List):
         """Finalize tree building after all data is loaded"""
         try:
-            # Process any remaining pending items
-            self.process_pending_items()
+            if self.model_view:
+                self.finalize_model_view()
+                return
+            
+            if self.population_queue:
+                # Runs again once the remaining items are inserted
+                self.finalize_pending = True
+                return
+            
+            if self.waiting_children:
+                logging.warning(f"{sum(map(len, self.waiting_children.values()))} items without a parent folder dropped")
+                for items in self.waiting_children.values():
+                    for tree_item in items:
+                        self.forget_subtree(tree_item)
+                self.waiting_children.clear()
+            
+            self.apply_selection_to_tree()
             
             # Expand first two levels
             self.tree.expandToDepth(1)
             
-            # Final column resize
-            for i in range(3):
-                self.tree.resizeColumnToContents(i)
+            self.rebuild_name_index()
+            if self.search_box.text():
+                self.run_search()
             
-            # Restore selection if available
-            if hasattr(self, '_pending_selection') and self._pending_selection:
-                self.restore_selected_files(self._pending_selection)
-                self._pending_selection = []
+            if self.watching:
+                self.directory_watcher.watch([self.root_directory] + self.get_loaded_directories())
             
-            # Clear caches
-            self.items_by_path.clear()
-            self.pending_items.clear()
+            # Lazy mode: list the next levels in the background
+            if self.lazy_loading and self.prefetch_thread:
+                root = self.tree.invisibleRootItem()
+                top_dirs = [root.child(i).data(0, Qt.UserRole) for i in range(root.childCount())
+                            if root.child(i).data(0, LAZY_ROLE)]
+                self.prefetch_thread.prefetch(top_dirs, levels=2)
             
         except Exception as e:
             logging.error(f"Error finalizing tree building: {e}")
 
-    def restore_selected_files(self, selected_files: List[str]):
-        """Set check state for files in selected_files (relative paths)"""
-        root = self.tree.invisibleRootItem()
-        root_dir = self.root_directory
-        # Build a set for fast lookup
-        selected_set = set(os.path.normpath(p) for p in selected_files)
-        def set_checked(item):
-            full_path = item.data(0, Qt.UserRole)
-            if os.path.isfile(full_path):
-                rel_path = os.path.normpath(os.path.relpath(full_path, root_dir))
-                if rel_path in selected_set:
-                    item.setCheckState(0, Qt.Checked)
+    def finalize_model_view(self):
+        """Show the completed scan through a FileTreeModel"""
+        self.tree_model = FileTreeModel(self.file_index, self.selection, self.get_icon('folder'),
+                                        self.get_icon('file'), self.format_file_size, self.format_mtime, self)
+        proxy = EntryFilterProxyModel(self)
+        proxy.setSourceModel(self.tree_model)
+        self.tree_view.setModel(proxy)
+        self.tree_view.setColumnWidth(0, 400)
+        if self.restore_expanded is None:
+            self.tree_view.expandToDepth(1)
+        else:
+            expanded, scroll_position = self.restore_expanded
+            self.restore_expanded = None
+            dir_entries = {path: entry for entry, path in self.file_index.dir_paths.items() if entry >= 0}
+            for path in expanded:
+                entry = dir_entries.get(path)
+                if entry is not None:
+                    self.tree_view.expand(proxy.mapFromSource(self.tree_model.entry_index(entry)))
+            self.tree_view.verticalScrollBar().setValue(scroll_position)
+        
+        self.tree_version += 1
+        self.rebuild_name_index()
+        if self.search_box.text():
+            self.run_search()
+        
+        if self.watching:
+            self.directory_watcher.watch(list(self.file_index.dir_paths.values()))
+
+    def selection_state(self, full_path: str, is_dir: bool) -> Qt.CheckState:
+        """Check state of a path according to the selection rules"""
+        rel_path = os.path.relpath(full_path, self.root_directory)
+        if is_dir:
+            included = self.selection.subtree_rule(rel_path)
+            if included is None:
+                return Qt.PartiallyChecked
+        else:
+            included = self.selection.is_included(rel_path)
+        return Qt.Checked if included else Qt.Unchecked
+
+    def build_merge_plan(self) -> MergePlan:
+        """Snapshot the loaded tree and the selection into a MergePlan"""
+        entries = []
+        if self.model_view:
+            if self.file_index is not None:
+                self.collect_index_entries(-1, 0, None, entries)
+        else:
+            self.flush_tree_population()
+            self.collect_item_entries(self.tree.invisibleRootItem(), 0, None, entries)
+        return MergePlan(self.root_directory, entries)
+
+    def plan_size(self, full_path: str, size: int) -> int:
+        """Size of a selected file from the stat cache, or its tree size if it is gone"""
+        metadata = self.stat_cache.lookup(full_path)
+        if metadata is None or metadata[0]:
+            return size
+        return metadata[1]
+
+    def collect_item_entries(self, parent_item: QTreeWidgetItem, depth: int,
+                             inherited: Optional[Qt.CheckState], entries: List):
+        """Add the children of a tree item to the plan entries, states from the selection"""
+        child_count = parent_item.childCount()
+        for i in range(child_count):
+            child = parent_item.child(i)
+            full_path = child.data(0, Qt.UserRole)
+            is_dir = bool(child.data(0, IS_DIR_ROLE))
+            # Below a fully (de)selected folder every entry shares its state
+            check_state = inherited if inherited is not None else self.selection_state(full_path, is_dir)
+            entries.append((full_path, depth, i == child_count - 1, is_dir,
+                            self.plan_size(full_path, child.size) if check_state == Qt.Checked else child.size,
+                            check_state))
+            
+            if is_dir and check_state != Qt.Unchecked:
+                child_inherited = None if check_state == Qt.PartiallyChecked else check_state
+                if child.data(0, LAZY_ROLE):
+                    self.collect_listed_entries(full_path, depth + 1, child_inherited, entries)
                 else:
-                    item.setCheckState(0, Qt.Unchecked)
+                    self.collect_item_entries(child, depth + 1, child_inherited, entries)
+
+    def collect_listed_entries(self, path: str, depth: int, inherited: Optional[Qt.CheckState], entries: List):
+        """Add a folder that is not in the tree yet to the plan entries, listed from disk"""
+        listing = self.prefetched_listings.get(path)
+        if listing is None:
+            listing = self.lazy_scanner.list_item_data(path)
+        for i, item_data in enumerate(listing):
+            full_path = item_data['full_path']
+            is_dir = item_data['is_dir']
+            check_state = inherited if inherited is not None else self.selection_state(full_path, is_dir)
+            entries.append((full_path, depth, i == len(listing) - 1, is_dir,
+                            0 if is_dir else item_data['size'], check_state))
+            
+            if is_dir and check_state != Qt.Unchecked:
+                self.collect_listed_entries(full_path, depth + 1,
+                                            None if check_state == Qt.PartiallyChecked else check_state, entries)
+
+    def collect_index_entries(self, parent: int, depth: int, inherited: Optional[Qt.CheckState], entries: List):
+        """Add the children of a FileIndex folder (-1 for the root) to the plan entries"""
+        file_index = self.file_index
+        children = file_index.children(parent)
+        for i, entry in enumerate(children):
+            full_path = file_index.path(entry)
+            is_dir = bool(file_index.is_dir[entry])
+            check_state = inherited if inherited is not None else self.selection_state(full_path, is_dir)
+            size = 0 if is_dir else file_index.sizes[entry]
+            entries.append((full_path, depth, i == len(children) - 1, is_dir,
+                            self.plan_size(full_path, size) if check_state == Qt.Checked else size, check_state))
+            
+            if is_dir and check_state != Qt.Unchecked:
+                self.collect_index_entries(entry, depth + 1,
+                                           None if check_state == Qt.PartiallyChecked else check_state, entries)
+
+    def apply_selection_to_tree(self):
+        """Set all check states from the selection, descending only into partly selected folders"""
+        was_updating = self.updating
+        self.updating = True
+        try:
+            root = self.tree.invisibleRootItem()
+            for i in range(root.childCount()):
+                self.apply_selection_to_item(root.child(i))
+        finally:
+            self.updating = was_updating
+
+    def apply_selection_to_item(self, item: QTreeWidgetItem):
+        was_updating = self.updating
+        self.updating = True
+        check_state = self.selection_state(item.data(0, Qt.UserRole), item.data(0, IS_DIR_ROLE))
+        if check_state == Qt.PartiallyChecked and item.childCount():
+            item.pending_state = None
             for i in range(item.childCount()):
-                set_checked(item.child(i))
-        for i in range(root.childCount()):
-            set_checked(root.child(i))
+                self.apply_selection_to_item(item.child(i))
+            self.count_children(item)
+            check_state = self.state_from_counts(item)
+        else:
+            self.check_all_children(item, check_state)
+        item.check_state = check_state
+        item.setCheckState(0, check_state)
+        self.updating = was_updating
 
     def on_tree_loading_finished(self, success: bool):
         """Handle tree loading completion"""
@@ -1509,8 +4849,10 @@ class FileMergerApp(QMainWindow):
         self.browse_button.setEnabled(True)
         
         if success:
-            file_count = self.count_all_files(self.tree.invisibleRootItem())
-            self.statusBar.showMessage(f"Loaded {file_count} files successfully", 3000)
+            file_count = self.file_index.file_count()
+            self.statusBar.showMessage(
+                f"Loaded {file_count} files successfully ({self.stat_cache.hits} stat calls saved this session)", 3000)
+            logging.info(self.stat_cache.summary())
         else:
             self.statusBar.showMessage("Error loading files", 5000)
             QMessageBox.warning(self, "Error", "Failed to load directory. Check the log for details.")
@@ -1532,167 +4874,390 @@ class FileMergerApp(QMainWindow):
             size_bytes /= 1024.0
         return f"{size_bytes:.1f}TB"
 
-    def count_all_files(self, tree_item: QTreeWidgetItem) -> int:
-        """Count total files in tree"""
-        count = 0
-        for index in range(tree_item.childCount()):
-            child = tree_item.child(index)
-            full_path = child.data(0, Qt.UserRole)
-            if os.path.isfile(full_path):
-                count += 1
-            else:
-                count += self.count_all_files(child)
-        return count
+    def format_mtime(self, mtime_ns: int) -> str:
+        """Format a modification time in nanoseconds for the tree"""
+        return datetime.fromtimestamp(mtime_ns / 1e9).strftime("%Y-%m-%d %H:%M")
 
     def filter_tree(self, text: str):
-        """Filter tree items based on search text"""
-        def filter_item(item):
-            text_lower = text.lower()
-            item_text = item.text(0).lower()
-            
-            # Check if current item matches
-            matches = text_lower in item_text
-            
-            visible_children = 0
-            for i in range(item.childCount()):
-                child = item.child(i)
-                if filter_item(child):
-                    visible_children += 1
+        """Filter the tree once typing pauses"""
+        self.search_timer.start()
+
+    def run_search(self):
+        """Send the search text to the search thread, rebuilding its index if the tree changed"""
+        text = self.search_box.text()
+        self.search_generation += 1
+        if not text:
+            self.apply_search_results(self.search_generation, None)
+            return
+        if self.model_view and self.tree_model is None:
+            return
+        
+        if self.name_index_version != self.tree_version and not self.model_view:
+            self.rebuild_name_index()
+        self.search_thread.search(self.search_generation, text)
+
+    def rebuild_name_index(self):
+        """Index the names of the current tree on the search thread"""
+        self.name_index_version = self.tree_version
+        if self.model_view:
+            file_index = self.file_index
+            self.search_thread.rebuild(lambda: NameIndex(file_index.names, file_index.parents))
+        else:
+            paths = list(self.items_by_path)
+            self.search_thread.rebuild(lambda: NameIndex.from_paths(paths))
+
+    def show_path_finder(self):
+        """Open the fuzzy path finder over the current tree"""
+        if not self.root_directory or (self.model_view and self.tree_model is None):
+            return
+        
+        if self.path_index_version != self.tree_version:
+            self.path_index_version = self.tree_version
+            root_directory = self.root_directory
+            file_source = self.tree_file_source()
             
-            # Show item if it matches or has visible children
-            should_show = matches or visible_children > 0 or not text
-            item.setHidden(not should_show)
+            def build():
+                files = file_source()
+                return PathFinderIndex(root_directory, [path for path, _, _ in files],
+                                       array('q', (mtime_ns for _, _, mtime_ns in files)))
+            self.path_finder_thread.rebuild(build)
+        
+        dialog = PathFinderDialog(self.path_finder_thread, self)
+        if dialog.exec_() == QDialog.Accepted and dialog.selected_paths:
+            self.include_paths(dialog.selected_paths)
+
+    def toggle_content_search(self):
+        """Start a content search, or stop the running one"""
+        if self.content_search_thread and self.content_search_thread.isRunning():
+            self.content_search_thread.cancel()
+            return
+        
+        text = self.content_search_edit.text()
+        if not text or not self.root_directory:
+            return
+        if (self.tree_loader_thread and self.tree_loader_thread.isRunning()) or \
+                (self.model_view and self.tree_model is None):
+            self.content_status_label.setText("Wait until the folder has finished loading")
+            return
+        
+        self.content_results.clear()
+        self.select_matches_button.setEnabled(False)
+        self.content_search_button.setText("Stop")
+        self.content_status_label.setText(f"Searching for '{text}'...")
+        
+        self.content_search_thread = ContentSearchThread(
+            self.tree_file_source(), text, self.content_match_case_check.isChecked(),
+            self.max_size_spin.value() * 1024 * 1024
+        )
+        self.content_search_thread.matches_found.connect(self.add_content_matches)
+        self.content_search_thread.progress_updated.connect(
+            lambda progress: self.content_status_label.setText(f"Searching for '{text}'... {progress}%"))
+        self.content_search_thread.search_finished.connect(self.on_content_search_finished)
+        self.content_search_thread.start()
+
+    def add_content_matches(self, hits: List[Tuple[str, int, str]]):
+        """Append streamed matches to the results panel"""
+        items = []
+        for full_path, count, line in hits:
+            item = QTreeWidgetItem([os.path.relpath(full_path, self.root_directory), str(count), line])
+            item.setData(0, Qt.UserRole, full_path)
+            item.setToolTip(2, line)
+            items.append(item)
+        self.content_results.addTopLevelItems(items)
+        self.select_matches_button.setEnabled(True)
+
+    def on_content_search_finished(self, matched: int, searched: int):
+        """Handle content search completion"""
+        self.content_search_button.setText("Search")
+        self.content_results.sortItems(0, Qt.AscendingOrder)
+        self.content_status_label.setText(f"{matched} of {searched} searched files match")
+
+    def select_content_matches(self):
+        """Add every file of the content search results to the merge"""
+        paths = [self.content_results.topLevelItem(i).data(0, Qt.UserRole)
+                 for i in range(self.content_results.topLevelItemCount())]
+        self.include_paths(paths)
+
+    def tree_file_source(self):
+        """Function returning (path, size, mtime_ns) of every file in the tree, callable from any thread"""
+        if self.model_view:
+            file_index = self.file_index
             
-            return should_show
+            def files():
+                return [(file_index.path(entry), file_index.sizes[entry], file_index.mtimes[entry])
+                        for entry in range(len(file_index))
+                        if not file_index.is_dir[entry] and not file_index.removed[entry]]
+            return files
+        
+        snapshot = [(path, item.size, item.mtime_ns) for path, item in self.items_by_path.items()
+                    if not item.data(0, IS_DIR_ROLE)]
+        return lambda: snapshot
+
+    def include_paths(self, paths: List[str]):
+        """Check files in the tree, adding them to the merge, and show the last one"""
+        added = 0
+        if self.model_view:
+            index = None
+            for path in paths:
+                entry = self.file_index.find(path)
+                if entry is None or entry < 0:
+                    continue
+                index = self.tree_model.entry_index(entry)
+                self.tree_model.setData(index, Qt.Checked, Qt.CheckStateRole)
+                added += 1
+            if index is not None:
+                self.tree_view.setCurrentIndex(self.tree_view.model().mapFromSource(index))
+        else:
+            last_item = None
+            self.tree.setUpdatesEnabled(False)
+            try:
+                for path in paths:
+                    item = self.items_by_path.get(path)
+                    if item is None:
+                        continue
+                    # handle_item_changed records the rule and updates the folders above
+                    item.setCheckState(0, Qt.Checked)
+                    last_item = item
+                    added += 1
+            finally:
+                self.tree.setUpdatesEnabled(True)
+            if last_item is not None:
+                self.tree.setCurrentItem(last_item)
+        self.statusBar.showMessage(f"Added {added} file(s) to the merge", 3000)
+
+    def apply_search_results(self, generation: int, results):
+        """Show only the matches and their folders (everything for None), in one batch
         
-        # Apply filter to all top-level items
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            filter_item(root.child(i))
+        Results are the visible entries for the large tree view and (hidden, changed, previous
+        hidden) paths from the search thread for the item tree.
+        """
+        if generation != self.search_generation:
+            return
+        
+        if self.model_view:
+            proxy = self.tree_view.model()
+            if isinstance(proxy, EntryFilterProxyModel):
+                proxy.set_visible_entries(results)
+            return
+        
+        if results is None:
+            hidden = set()
+            changed = self.hidden_paths
+        else:
+            hidden, changed, previous = results
+            if previous is not self.hidden_paths:
+                # The previous answer was never shown (dropped, cleared or for an older tree)
+                changed = hidden ^ self.hidden_paths
+        self.tree.setUpdatesEnabled(False)
+        try:
+            for path in changed:
+                item = self.items_by_path.get(path)
+                if item is not None:
+                    item.setHidden(path in hidden)
+        finally:
+            self.tree.setUpdatesEnabled(True)
+        self.hidden_paths = hidden
 
     def handle_item_changed(self, item: QTreeWidgetItem, column: int):
         """Handle tree item check state changes"""
         if self.updating or column != 0:
             return
         
-        self.updating = True
-        
-        # Update children based on parent status
-        check_state = item.checkState(column)
-        if check_state in [Qt.Checked, Qt.Unchecked]:
-            self.check_all_children(item, check_state)
-        
-        # Update parent status
-        self.update_parent_state(item.parent())
+        check_state = item.checkState(0)
+        if check_state == item.check_state:
+            # Text or icon change
+            return
         
-        self.updating = False
+        was_updating = self.updating
+        self.updating = True
+        try:
+            # A hidden item changed from code: bring its ancestors' pending states down first
+            ancestors = []
+            parent = item.parent()
+            while parent is not None:
+                ancestors.append(parent)
+                parent = parent.parent()
+            for ancestor in reversed(ancestors):
+                if ancestor.pending_state is not None:
+                    self.apply_pending_state(ancestor)
+            if item.checkState(0) != check_state:
+                item.setCheckState(0, check_state)
+            
+            old_state = item.check_state
+            item.check_state = check_state
+            if check_state in [Qt.Checked, Qt.Unchecked]:
+                self.selection.set(os.path.relpath(item.data(0, Qt.UserRole), self.root_directory),
+                                   check_state == Qt.Checked)
+                self.check_all_children(item, check_state)
+            self.update_ancestor_counts(item, old_state, check_state)
+        finally:
+            self.updating = was_updating
     
     def check_all_children(self, item: QTreeWidgetItem, check_state: Qt.CheckState):
-        """Recursively check/uncheck all children"""
+        """Give a folder's subtree a check state; only expanded folders are written right away"""
+        if not item.childCount():
+            item.pending_state = None
+            return
+        item.checked_children = item.childCount() if check_state == Qt.Checked else 0
+        item.partial_children = 0
+        item.pending_state = check_state
+        if item.isExpanded():
+            self.apply_pending_state(item)
+
+    def apply_pending_state(self, item: QTreeWidgetItem):
+        """Write a folder's pending check state to its children"""
+        check_state = item.pending_state
+        item.pending_state = None
         for i in range(item.childCount()):
             child = item.child(i)
+            child.check_state = check_state
             child.setCheckState(0, check_state)
             self.check_all_children(child, check_state)
 
-    def update_parent_state(self, parent: Optional[QTreeWidgetItem]):
-        """Update parent check state based on children"""
-        if parent is None:
+    def count_children(self, item: QTreeWidgetItem):
+        """Count a folder's checked and partially checked children"""
+        if item.pending_state is not None:
+            item.checked_children = item.childCount() if item.pending_state == Qt.Checked else 0
+            item.partial_children = 0
             return
-        
-        checked_count = 0
-        partially_checked_count = 0
-        total_count = parent.childCount()
-        
-        for i in range(total_count):
-            child_state = parent.child(i).checkState(0)
+        checked = partial = 0
+        for i in range(item.childCount()):
+            child_state = item.child(i).check_state
             if child_state == Qt.Checked:
-                checked_count += 1
+                checked += 1
             elif child_state == Qt.PartiallyChecked:
-                partially_checked_count += 1
-        
-        if checked_count == total_count:
-            parent.setCheckState(0, Qt.Checked)
-        elif checked_count == 0 and partially_checked_count == 0:
-            parent.setCheckState(0, Qt.Unchecked)
-        else:
-            parent.setCheckState(0, Qt.PartiallyChecked)
+                partial += 1
+        item.checked_children = checked
+        item.partial_children = partial
+
+    def state_from_counts(self, item: QTreeWidgetItem) -> Qt.CheckState:
+        if item.checked_children == item.childCount():
+            return Qt.Checked
+        if item.checked_children == 0 and item.partial_children == 0:
+            return Qt.Unchecked
+        return Qt.PartiallyChecked
+
+    def update_ancestor_counts(self, item: QTreeWidgetItem, old_state: Qt.CheckState, new_state: Qt.CheckState):
+        """Adjust the counters along the ancestor chain after one item changed state"""
+        parent = item.parent()
+        while parent is not None and old_state != new_state:
+            if parent.checked_children is None:
+                self.count_children(parent)
+            else:
+                if old_state == Qt.Checked:
+                    parent.checked_children -= 1
+                elif old_state == Qt.PartiallyChecked:
+                    parent.partial_children -= 1
+                if new_state == Qt.Checked:
+                    parent.checked_children += 1
+                elif new_state == Qt.PartiallyChecked:
+                    parent.partial_children += 1
+            
+            old_state, new_state = parent.check_state, self.state_from_counts(parent)
+            if new_state != old_state:
+                parent.check_state = new_state
+                parent.setCheckState(0, new_state)
+            parent = parent.parent()
+
+    def update_parent_state(self, parent: Optional[QTreeWidgetItem]):
+        """Recount a folder whose children were added or removed and update its ancestors"""
+        if parent is None:
+            return
         
-        # Recursively update parent's parent
-        self.update_parent_state(parent.parent())
+        self.count_children(parent)
+        old_state, new_state = parent.check_state, self.state_from_counts(parent)
+        if new_state != old_state:
+            parent.check_state = new_state
+            parent.setCheckState(0, new_state)
+            self.update_ancestor_counts(parent, old_state, new_state)
 
-    def select_all_files(self):
-        """Select all files in tree"""
+    def set_all_check_states(self, check_state: Qt.CheckState):
+        """Check or uncheck every item"""
+        self.selection.set('', check_state == Qt.Checked)
+        was_updating = self.updating
         self.updating = True
         
         root = self.tree.invisibleRootItem()
         for i in range(root.childCount()):
             child = root.child(i)
-            child.setCheckState(0, Qt.Checked)
-            self.check_all_children(child, Qt.Checked)
+            child.check_state = check_state
+            child.setCheckState(0, check_state)
+            self.check_all_children(child, check_state)
         
-        self.updating = False
+        self.updating = was_updating
+
+    def select_all_files(self):
+        """Select all files in tree"""
+        if self.model_view:
+            if self.tree_model is not None:
+                self.tree_model.set_all(Qt.Checked)
+            return
+        
+        self.set_all_check_states(Qt.Checked)
 
     def select_no_files(self):
         """Deselect all files in tree"""
-        self.updating = True
-        
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            child = root.child(i)
-            child.setCheckState(0, Qt.Unchecked)
-            self.check_all_children(child, Qt.Unchecked)
+        if self.model_view:
+            if self.tree_model is not None:
+                self.tree_model.set_all(Qt.Unchecked)
+            return
         
-        self.updating = False
+        self.set_all_check_states(Qt.Unchecked)
 
     def refresh_tree(self):
         """Refresh the file tree"""
         if self.root_directory:
-            self.start_tree_loading()
+            self.start_tree_loading(refresh=True)
+
+    def preview_index(self, index: QModelIndex):
+        """Preview the file double-clicked in the large tree view"""
+        index = index.sibling(index.row(), 0)
+        if not index.data(IS_DIR_ROLE):
+            self.preview_path(index.data(Qt.UserRole))
 
     def preview_file(self, item: QTreeWidgetItem, column: int):
         """Preview selected file in preview tab"""
-        full_path = item.data(0, Qt.UserRole)
-        if not os.path.isfile(full_path):
+        if not item.data(0, IS_DIR_ROLE):
+            self.preview_path(item.data(0, Qt.UserRole))
+
+    def preview_path(self, full_path: str):
+        """Show a file in the preview tab"""
+        metadata = self.stat_cache.lookup(full_path)
+        if metadata is None or metadata[0]:
             return
             
         try:
-            file_size = os.path.getsize(full_path)
+            file_size = metadata[1]
             if file_size > 1_000_000:  # 1MB limit for preview
                 self.preview_text.setPlainText(f"File too large for preview ({self.format_file_size(file_size)})")
                 return
             
-            # Detect encoding
-            encoding = 'utf-8'
-            if HAS_CHARDET:
-                try:
-                    with open(full_path, 'rb') as f:
-                        raw_data = f.read(10000)
-                        result = chardet.detect(raw_data)
-                        if result['confidence'] > 0.7:
-                            encoding = result['encoding']
-                except:
-                    pass
-            
-            with open(full_path, 'r', encoding=encoding, errors='replace') as f:
-                content = f.read()
-                
-                # Check if binary
-                if '\x00' in content:
-                    self.preview_text.setPlainText("Binary file - cannot preview")
-                    return
-                
-                # Add file info header
-                header = f"File: {os.path.basename(full_path)}\n"
-                header += f"Path: {os.path.relpath(full_path, self.root_directory)}\n"
-                header += f"Size: {self.format_file_size(file_size)}\n"
-                header += f"Encoding: {encoding}\n"
-                header += "=" * 50 + "\n\n"
-                
-                self.preview_text.setPlainText(header + content)
-                
-                # Switch to preview tab
-                self.tab_widget.setCurrentIndex(2)
-                
+            with open(full_path, 'rb') as f:
+                # One byte more than the limit, in case the file grew since it was listed
+                raw = f.read(1_000_001)
+            file_size = len(raw)
+            if file_size > 1_000_000:
+                self.preview_text.setPlainText("File too large for preview (grew since it was listed)")
+                return
+            content, encoding = FileProcessor.decode_bytes(raw)
+            
+            # Check if binary
+            if '\x00' in content:
+                self.preview_text.setPlainText("Binary file - cannot preview")
+                return
+            
+            # Add file info header
+            header = f"File: {os.path.basename(full_path)}\n"
+            header += f"Path: {os.path.relpath(full_path, self.root_directory)}\n"
+            header += f"Size: {self.format_file_size(file_size)}\n"
+            header += f"Encoding: {encoding}\n"
+            header += "=" * 50 + "\n\n"
+            
+            self.preview_text.setPlainText(header + content)
+            
+            # Switch to preview tab
+            self.tab_widget.setCurrentWidget(self.preview_tab)
+            
         except Exception as e:
             self.preview_text.setPlainText(f"Error previewing file: {str(e)}")
 
@@ -1712,8 +5277,15 @@ class FileMergerApp(QMainWindow):
             'max_file_size': self.max_size_spin.value() * 1024 * 1024,
             'include_binary': self.include_binary_check.isChecked(),
             'include_hidden': self.include_hidden_check.isChecked(),
-            'backup_mode': self.backup_check.isChecked()
+            'backup_mode': self.backup_check.isChecked(),
+            'deduplicate': self.dedup_check.isChecked(),
+            'read_workers': self.read_workers_spin.value(),
+            'readahead': self.readahead_spin.value(),
+            'block_cache': None,
+            'block_cache_size': self.block_cache_spin.value() * 1024 * 1024
         }
+        if self.block_cache_check.isChecked():
+            output_settings['block_cache'] = self.data_file_path('block_cache.db')
         
         # Update output folder
         self.output_folder = output_settings['output_folder']
@@ -1724,8 +5296,11 @@ class FileMergerApp(QMainWindow):
         self.cancel_button.setVisible(True)
         self.merge_button.setEnabled(False)
         
-        # Start processing thread
-        self.processor_thread = FileProcessor(self.tree, self.root_directory, output_settings)
+        # Start processing thread on a snapshot; the tree may keep changing while it runs
+        plan = self.build_merge_plan()
+        logging.info(f"Merge plan: {len(plan)} entries, {plan.selected_count} files, {plan.selected_bytes} bytes")
+        logging.info(self.stat_cache.summary())
+        self.processor_thread = FileProcessor(plan, output_settings)
         self.processor_thread.progress_updated.connect(self.progress_bar.setValue)
         self.processor_thread.status_updated.connect(self.statusBar.showMessage)
         self.processor_thread.finished_processing.connect(self.on_merge_finished)
@@ -1845,7 +5420,14 @@ class FileMergerApp(QMainWindow):
     def new_project(self):
         """Create new project"""
         self.root_directory = None
+        self.stop_prefetching()
+        self.directory_watcher.clear()
+        self.rescan_timer.stop()
         self.tree.clear()
+        self.items_by_path = {}
+        self.selection = SelectionTrie()
+        self.tree_view.setModel(None)
+        self.tree_model = None
         self.path_label.setText("No folder selected")
         self.preview_text.setPlainText("Double-click a file in the tree to preview it here...")
         self.search_box.clear()
@@ -1870,8 +5452,9 @@ class FileMergerApp(QMainWindow):
                     'max_file_size': self.max_size_spin.value(),
                     'include_binary': self.include_binary_check.isChecked(),
                     'include_hidden': self.include_hidden_check.isChecked(),
+                    'deduplicate': self.dedup_check.isChecked(),
                     'ignore_patterns': self.ignore_text.toPlainText().strip().split('\n'),
-                    'selected_files': self.get_selected_files()
+                    'selection': self.selection.rules()
                 }
                 
                 with open(filename, 'w', encoding='utf-8') as f:
@@ -1986,38 +5569,23 @@ class FileMergerApp(QMainWindow):
             self.max_size_spin.setValue(project_data.get('max_file_size', 10))
             self.include_binary_check.setChecked(project_data.get('include_binary', False))
             self.include_hidden_check.setChecked(project_data.get('include_hidden', False))
+            self.dedup_check.setChecked(project_data.get('deduplicate', False))
             ignore_patterns = project_data.get('ignore_patterns', [])
             self.ignore_text.setPlainText('\n'.join(ignore_patterns))
+            if 'selection' in project_data:
+                self.selection = SelectionTrie.from_rules(project_data['selection'])
+            else:
+                self.selection = SelectionTrie.from_selected_files(project_data.get('selected_files', []))
             # Reload tree
-            if self.root_directory and os.path.exists(self.root_directory):
+            metadata = self.stat_cache.lookup(self.root_directory) if self.root_directory else None
+            if metadata is not None and metadata[0]:
                 self.path_label.setText(f"📁 {self.root_directory}")
                 self.start_tree_loading()
-                # Store selection for later restoration
-                self._pending_selection = project_data.get('selected_files', [])
             self.statusBar.showMessage(f"Project loaded: {os.path.basename(filename)}", 3000)
         except Exception as e:
             logging.error(f"Error opening project: {e}")
             QMessageBox.critical(self, "Error", f"Could not open project: {e}")
 
-    def get_selected_files(self) -> List[str]:
-        """Get list of selected file paths"""
-        selected = []
-        
-        def collect_selected(item):
-            full_path = item.data(0, Qt.UserRole)
-            if item.checkState(0) == Qt.Checked and os.path.isfile(full_path):
-                rel_path = os.path.relpath(full_path, self.root_directory)
-                selected.append(rel_path)
-            
-            for i in range(item.childCount()):
-                collect_selected(item.child(i))
-        
-        root = self.tree.invisibleRootItem()
-        for i in range(root.childCount()):
-            collect_selected(root.child(i))
-        
-        return selected
-
     def show_about(self):
         """Show about dialog"""
         about_text = """
@@ -2082,6 +5650,45 @@ class FileMergerApp(QMainWindow):
             self.include_hidden_check.setChecked(
                 self.settings.value('include_hidden', False, type=bool)
             )
+            self.read_workers_spin.setValue(
+                int(self.settings.value('read_workers', 4))
+            )
+            self.readahead_spin.setValue(
+                int(self.settings.value('readahead', 32))
+            )
+            self.block_cache_check.setChecked(
+                self.settings.value('use_block_cache', True, type=bool)
+            )
+            self.block_cache_spin.setValue(
+                int(self.settings.value('block_cache_size', 256))
+            )
+            self.dedup_check.setChecked(
+                self.settings.value('deduplicate', False, type=bool)
+            )
+            self.scan_workers_spin.setValue(
+                int(self.settings.value('scan_workers', 4))
+            )
+            self.scan_index_check.setChecked(
+                self.settings.value('use_scan_index', True, type=bool)
+            )
+            self.lazy_load_check.setChecked(
+                self.settings.value('lazy_loading', False, type=bool)
+            )
+            self.watch_changes_check.setChecked(
+                self.settings.value('watch_changes', False, type=bool)
+            )
+            self.use_git_check.setChecked(
+                self.settings.value('use_git', False, type=bool)
+            )
+            self.git_untracked_check.setChecked(
+                self.settings.value('git_untracked', False, type=bool)
+            )
+            self.gitignore_check.setChecked(
+                self.settings.value('use_gitignore', False, type=bool)
+            )
+            self.large_tree_check.setChecked(
+                self.settings.value('large_tree_view', False, type=bool)
+            )
             
         except Exception as e:
             logging.warning(f"Error loading settings: {e}")
@@ -2098,6 +5705,19 @@ class FileMergerApp(QMainWindow):
             self.settings.setValue('max_file_size', self.max_size_spin.value())
             self.settings.setValue('include_binary', self.include_binary_check.isChecked())
             self.settings.setValue('include_hidden', self.include_hidden_check.isChecked())
+            self.settings.setValue('scan_workers', self.scan_workers_spin.value())
+            self.settings.setValue('read_workers', self.read_workers_spin.value())
+            self.settings.setValue('readahead', self.readahead_spin.value())
+            self.settings.setValue('use_block_cache', self.block_cache_check.isChecked())
+            self.settings.setValue('block_cache_size', self.block_cache_spin.value())
+            self.settings.setValue('deduplicate', self.dedup_check.isChecked())
+            self.settings.setValue('use_scan_index', self.scan_index_check.isChecked())
+            self.settings.setValue('lazy_loading', self.lazy_load_check.isChecked())
+            self.settings.setValue('watch_changes', self.watch_changes_check.isChecked())
+            self.settings.setValue('use_git', self.use_git_check.isChecked())
+            self.settings.setValue('git_untracked', self.git_untracked_check.isChecked())
+            self.settings.setValue('use_gitignore', self.gitignore_check.isChecked())
+            self.settings.setValue('large_tree_view', self.large_tree_check.isChecked())
             
         except Exception as e:
             logging.warning(f"Error saving settings: {e}")
@@ -2108,7 +5728,8 @@ class FileMergerApp(QMainWindow):
         running_threads = [
             self.processor_thread,
             self.tree_loader_thread,
-            self.restorer_thread
+            self.restorer_thread,
+            self.content_search_thread
         ]
         
         if any(thread and thread.isRunning() for thread in running_threads):
@@ -2128,6 +5749,11 @@ class FileMergerApp(QMainWindow):
                 event.ignore()
                 return
         
+        self.stop_prefetching()
+        for thread in (self.search_thread, self.path_finder_thread):
+            thread.cancel()
+            thread.wait(1000)
+        
         # Save settings
         self.save_settings()
         
@@ -2138,11 +5764,15 @@ class FileMergerApp(QMainWindow):
 
     def expand_all_files(self):
         """Expand all items in the file tree"""
-        if hasattr(self, 'tree') and self.tree:
+        if self.model_view:
+            self.tree_view.expandAll()
+        elif hasattr(self, 'tree') and self.tree:
             self.tree.expandAll()
     def collapse_all_files(self):
         """Collapse all items in the file tree"""
-        if hasattr(self, 'tree') and self.tree:
+        if self.model_view:
+            self.tree_view.collapseAll()
+        elif hasattr(self, 'tree') and self.tree:
             self.tree.collapseAll()
 
 
@@ -23,6 +23,7 @@ def parse_merge_datei(dateipfad):
         return None
 
     wiederherzustellende_dateien = []
+    verweise = []
     
     # Wir suchen den Start des "File Contents"-Abschnitts
     inhalt_start_marker = "File Contents"
@@ -55,6 +56,12 @@ def parse_merge_datei(dateipfad):
             
             relativer_pfad = pfad_match.group(1).strip()
 
+            # Identische Dateien stehen nur einmal im Merge, spätere Kopien verweisen auf die erste
+            verweis_match = re.search(r"📁 Path: .*?\n⚠️ Status: 🔁 Same as (.*?)\n", voller_block)
+            if verweis_match:
+                verweise.append((relativer_pfad, verweis_match.group(1).strip()))
+                continue
+
             # Extrahiere den Inhalt der Datei
             # Der Inhalt beginnt nach der ersten `====...====` Linie im Block
             inhalt_start_index = voller_block.find("================================================================================\n\n")
@@ -77,6 +84,14 @@ def parse_merge_datei(dateipfad):
             print(f"Fehler beim Parsen eines Blocks: {e}")
             continue
 
+    inhalte = {datei['pfad']: datei['inhalt'] for datei in wiederherzustellende_dateien}
+    for relativer_pfad, original_pfad in verweise:
+        if original_pfad in inhalte:
+            wiederherzustellende_dateien.append({
+                'pfad': relativer_pfad,
+                'inhalt': inhalte[original_pfad]
+            })
+
     if not wiederherzustellende_dateien:
         messagebox.showwarning("Keine Dateien gefunden", "Es konnten keine wiederherstellbaren Dateiinhalte in der Merge-Datei gefunden werden.")
         return None